@@ -0,0 +1,263 @@
+"""
+Benchmark the fraction solvers used to express divider ratios as a + b/c.
+
+Solvers:
+    rational : rational.rational_approximation
+    wut      : Si5351_wut.__fraction_solve
+    abc      : clock.compute_abc (uncached)
+
+Each solver is run over grids of PLL feedback multipliers (15-90) and MultiSynth
+dividers (6-1800):
+    dense       : evenly spaced values across the range
+    adversarial : values with huge partial quotients, fractional parts next to
+                  0 or 1, denominators close to C_MAX, and long continued fractions
+
+Reported per solver and grid: calls/sec, median and worst-case latency, continued
+fraction terms (iterations) of the result, max frequency error in Hz and ppm, and
+the number of failures (exceptions or c > C_MAX).  Results are written as JSON.
+
+    python benchmarks/bench_rational.py --output bench.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+from fractions import Fraction
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from snail.Si5351_Clock import rational
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import constants
+from snail.Si5351_Clock import Si5351_wut
+
+
+F_XTAL = 25e6
+F_PLL = 800e6
+
+MULTIPLIER_RANGE = (15, 90)
+DIVIDER_RANGE = (6, 1800)
+
+
+
+#------------------------------------------------
+# Solvers, each taking a value and returning (a, b, c)
+
+def solve_rational(value):
+    a = math.floor(value)
+    b, c = rational.rational_approximation(value - a, max_den=constants.C_MAX)
+    return a, b, c
+
+def solve_wut(value):
+    a = math.floor(value)
+    b, c = Si5351_wut.Si5351_wut._Si5351_wut__fraction_solve(None, value - a)
+    return a, int(b), int(c)
+
+def solve_abc(value):
+    return getattr(clock.compute_abc, '__wrapped__', clock.compute_abc)(value)
+
+solvers = {'rational': solve_rational,
+           'wut': solve_wut,
+           'abc': solve_abc}
+
+
+
+#------------------------------------------------
+# Grids of values
+
+def dense_grid(lo, hi, points):
+    """Evenly spaced values between lo and hi, at the midpoints of points equal steps
+    """
+    return [lo + (hi - lo)*(k + 0.5)/points for k in range(points)]
+
+
+
+def adversarial_grid(lo, hi, points, seed):
+    """Values hard on continued fraction solvers
+    """
+    rnd = random.Random(seed)
+    C_MAX = constants.C_MAX
+    phi = (math.sqrt(5) - 1)/2
+
+    values = []
+    while len(values) < points:
+        a = rnd.randrange(int(lo), int(hi))
+        kind = len(values) % 6
+        if kind == 0:
+            # Fractional part just above zero: huge first partial quotient
+            frac = 1/rnd.randrange(C_MAX//2, 4*C_MAX)
+        elif kind == 1:
+            # Fractional part just below one
+            frac = 1 - 1/rnd.randrange(C_MAX//2, 4*C_MAX)
+        elif kind == 2:
+            # Exact fraction with denominator close to C_MAX
+            c = rnd.randrange(C_MAX - 1000, C_MAX + 1)
+            frac = rnd.randrange(1, c)/c
+        elif kind == 3:
+            # Halfway between two neighbouring fractions near C_MAX
+            c = rnd.randrange(C_MAX//2, C_MAX)
+            b = rnd.randrange(1, c)
+            frac = (b + 0.5)/c
+        elif kind == 4:
+            # Golden ratio conjugate: the longest continued fractions
+            frac = phi/(1 + rnd.randrange(0, 4))
+        else:
+            # Ratios of real-world frequencies
+            frac = math.modf(F_PLL/rnd.uniform(F_PLL/hi, F_PLL/lo))[0]
+
+        value = a + frac
+        if lo <= value < hi:
+            values.append(value)
+
+    return values
+
+
+
+def continued_fraction_terms(b, c):
+    """Number of continued fraction terms of b/c, a measure of solver iterations
+    """
+    terms = 0
+    while c:
+        b, c = c, b % c
+        terms += 1
+
+    return terms
+
+
+
+#------------------------------------------------
+
+def frequency_error(kind, value, a, b, c):
+    """Return (Hz, ppm) error of the realized frequency
+    """
+    realized = a + Fraction(b, c)
+    if kind == 'multiplier':
+        target = Fraction(F_XTAL)*Fraction(value)
+        actual = Fraction(F_XTAL)*realized
+    else:
+        target = Fraction(F_PLL)/Fraction(value)
+        actual = Fraction(F_PLL)/realized
+
+    error = abs(actual - target)
+
+    return float(error), float(error/target)*1e6
+
+
+
+def run(solver, kind, values, repeat):
+    """Time and check one solver over a grid of values
+    """
+    latencies = []
+    terms = []
+    error_Hz = 0.
+    error_ppm = 0.
+    failures = 0
+
+    for value in values:
+        best = math.inf
+        result = None
+        for k in range(repeat):
+            t0 = time.perf_counter()
+            try:
+                result = solver(value)
+            except Exception:
+                result = None
+            best = min(best, time.perf_counter() - t0)
+
+        latencies.append(best)
+        if result is None or not 0 < result[2] <= constants.C_MAX:
+            failures += 1
+            continue
+
+        a, b, c = result
+        terms.append(continued_fraction_terms(b, c))
+
+        Hz, ppm = frequency_error(kind, value, a, b, c)
+        error_Hz = max(error_Hz, Hz)
+        error_ppm = max(error_ppm, ppm)
+
+    latencies.sort()
+    total = sum(latencies)
+
+    return {'calls': len(values),
+            'calls_per_sec': len(values)/total if total else math.inf,
+            'latency_median_us': latencies[len(latencies)//2]*1e6,
+            'latency_worst_us': latencies[-1]*1e6,
+            'iterations_mean': sum(terms)/len(terms) if terms else None,
+            'iterations_max': max(terms) if terms else None,
+            'error_max_Hz': error_Hz,
+            'error_max_ppm': error_ppm,
+            'failures': failures}
+
+
+
+def benchmark(names, points, repeat, seed):
+    """Return dict of benchmark results
+    """
+    grids = {}
+    for kind, (lo, hi) in [('multiplier', MULTIPLIER_RANGE), ('divider', DIVIDER_RANGE)]:
+        grids[kind + '/dense'] = (kind, dense_grid(lo, hi, points))
+        grids[kind + '/adversarial'] = (kind, adversarial_grid(lo, hi, points, seed))
+
+    results = {}
+    for name in names:
+        results[name] = {}
+        for grid, (kind, values) in grids.items():
+            results[name][grid] = run(solvers[name], kind, values, repeat)
+
+    return {'config': {'points': points,
+                       'repeat': repeat,
+                       'seed': seed,
+                       'f_XTAL': F_XTAL,
+                       'f_PLL': F_PLL,
+                       'multiplier_range': MULTIPLIER_RANGE,
+                       'divider_range': DIVIDER_RANGE,
+                       'C_MAX': constants.C_MAX},
+            'platform': {'python': platform.python_version(),
+                         'implementation': platform.python_implementation(),
+                         'machine': platform.machine(),
+                         'system': platform.system()},
+            'results': results}
+
+
+
+def report(data):
+    """Print results table
+    """
+    print('{:9s} {:23s} {:>10s} {:>10s} {:>10s} {:>6s} {:>12s} {:>10s} {:>5s}'.format(
+          'solver', 'grid', 'calls/s', 'median us', 'worst us', 'iter', 'max err Hz', 'max ppm', 'fail'))
+
+    for name, grids in data['results'].items():
+        for grid, r in grids.items():
+            print('{:9s} {:23s} {:10.0f} {:10.2f} {:10.2f} {:>6} {:12.3g} {:10.3g} {:5d}'.format(
+                  name, grid, r['calls_per_sec'], r['latency_median_us'], r['latency_worst_us'],
+                  r['iterations_max'], r['error_max_Hz'], r['error_max_ppm'], r['failures']))
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark rational approximation solvers')
+    parser.add_argument('--solvers', nargs='+', choices=sorted(solvers), default=sorted(solvers))
+    parser.add_argument('--points', type=int, default=2000, help='values per grid')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repeats per value, best is kept')
+    parser.add_argument('--seed', type=int, default=5351, help='seed for the adversarial grids')
+    parser.add_argument('--output', default='bench_rational.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    data = benchmark(args.solvers, args.points, args.repeat, args.seed)
+
+    with open(args.output, 'w') as fo:
+        json.dump(data, fo, indent=2)
+
+    report(data)
+
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    main()
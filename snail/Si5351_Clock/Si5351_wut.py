@@ -1,5 +1,10 @@
 import math
-import Adafruit_I2C
+
+try:
+    # Only needed to talk to hardware, the math below runs without it
+    import Adafruit_I2C
+except ImportError:
+    Adafruit_I2C = None
 
 Si5351_I2C_ADDRESS = 0x60
 
@@ -1,3 +1,5 @@
 from .clock import Clock
 from . import constants
 from . import rational
+from . import planner
+from . import sweep
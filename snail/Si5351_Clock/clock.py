@@ -1,20 +1,87 @@
 
-import numpy as np
+import math
+import time
+from fractions import Fraction
 
 from .. import device
+from .. import memoize
 from .  import registers
 from .  import constants
-from .rational import rational_approximation
+from .  import planner
 
 
             
+# Bundled register map, validated and compiled once on first use by Clock()
+_compiled_parameters = None
+
+def compiled_parameters():
+    """Return the bundled register map compiled for sharing between Clock instances
+    """
+    global _compiled_parameters
+    if _compiled_parameters is None:
+        _compiled_parameters = device.CompiledParameters(registers.parameters)
+
+    return _compiled_parameters
+
+#--------------------------------------------------------------------
+# Parameter values written by Clock.reset(): device defaults with all outputs disabled
+reset_values = {
+    # Specify clock state when its disabled
+    'CLK0_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK1_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK2_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK3_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK4_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK5_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK6_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+    'CLK7_DIS_STATE': constants.CLK_DIS_STATE_LOW,
+
+    # Disable all clocks
+    'CLK0_OEB': constants.CLK_OEB_DISABLE,
+    'CLK1_OEB': constants.CLK_OEB_DISABLE,
+    'CLK2_OEB': constants.CLK_OEB_DISABLE,
+    'CLK3_OEB': constants.CLK_OEB_DISABLE,
+    'CLK4_OEB': constants.CLK_OEB_DISABLE,
+    'CLK5_OEB': constants.CLK_OEB_DISABLE,
+    'CLK6_OEB': constants.CLK_OEB_DISABLE,
+    'CLK7_OEB': constants.CLK_OEB_DISABLE,
+
+    # Power down all output drivers
+    'CLK0_PDN': constants.CLK_PDN_OFF,
+    'CLK1_PDN': constants.CLK_PDN_OFF,
+    'CLK2_PDN': constants.CLK_PDN_OFF,
+    'CLK3_PDN': constants.CLK_PDN_OFF,
+    'CLK4_PDN': constants.CLK_PDN_OFF,
+    'CLK5_PDN': constants.CLK_PDN_OFF,
+    'CLK6_PDN': constants.CLK_PDN_OFF,
+    'CLK7_PDN': constants.CLK_PDN_OFF,
+
+    # Set interrupt masks to null thus allowing all asserts to go through
+    'SYS_INIT_MASK': 0,
+    'LOL_A_MASK': 0,
+    'LOL_B_MASK': 0,
+    'LOS_MASK': 0,
+
+    # Fanout options
+    'CLKIN_FANOUT_EN': constants.FANOUT_DISABLE,
+    'XO_FANOUT_EN': constants.FANOUT_DISABLE,
+    'MS_FANOUT_EN': constants.FANOUT_DISABLE,
+}
+
+
+
 class Clock(device.Device):
     """Device: Si5351 A/B/C
     """
-    def __init__(self, bus=1):
+    def __init__(self, bus=1, debug=False, shadow=False):
         """Instantiate device with register data for Si5351 clock generator
+
+        bus : bus number, or a bus backend object (see snail.bus)
+        shadow : serve read-modify-write cycles from an in-memory register image,
+                 roughly halving the number of bus transactions.
         """
-        super().__init__(registers.address, registers.parameters, bus)
+        super().__init__(registers.address, compiled_parameters(), bus,
+                         debug=debug, shadow=shadow, volatile=registers.volatile)
         self.f_XTAL = 25e6
         self.f_PLL = {'A': 0,
                       'B': 0}
@@ -26,77 +93,109 @@ class Clock(device.Device):
                      5: 0,
                      6: 0,
                      7: 0}
+
+        # Feedback multiplier (a, b, c) of each configured PLL
+        self._PLL_abc = {}
+
+        # Source PLL of each configured MultiSynth
+        self.src_PLL = {}
+
+        # Register bytes last written by retune(), per MultiSynth
+        self._retune_image = {}
+
+        # Duration (seconds) and number of register bytes written by last retune()
+        self.retune_latency = 0
+        self.retune_bytes = 0
+
+        # Register image applied by reset(), see compile_reset()
+        self.reset_values = dict(reset_values)
+        self.compile_reset()
         
-    def status(self):
-        """Print all status information
+    def status(self, verbose=True):
+        """Read system, PLL, MultiSynth and clock status with one bulk register read.
+        Print it when verbose.
+        Return status record, see read_status().
         """
-        print()
-        self.status_SYS()
+        record = self.read_status()
 
-        for PLL in ['A', 'B']:
-            print()
-            self.status_PLL(PLL)
+        if verbose:
+            print(format_status(record))
 
-        print()
-        for MS in range(3):
-            print()
-            self.status_MS(MS)
-        
-        print()
-        for CLK in range(3):
-            print()
-            self.status_CLK(CLK)
+        return record
+
+    def read_status(self, image=None):
+        """Return status record of the whole device as nested dicts:
 
-    def status_SYS(self):
+            {'SYS': {name: value},
+             'PLL': {'A': {name: value}, 'B': {...}},
+             'MS':  {0: {name: value}, ... 7: {...}},
+             'CLK': {0: {name: value}, ... 7: {...}}}
+
+        All registers are fetched together in a single bulk read, or decoded from a
+        previously captured register image, e.g. from snapshot().
+        """
+        groups = [('SYS', None)]
+        groups += [('PLL', x) for x in ['A', 'B']]
+        groups += [('MS', x) for x in range(8)]
+        groups += [('CLK', x) for x in range(8)]
+
+        names = []
+        for group, x in groups:
+            names += status_names(group, x)
+
+        if image is None:
+            values = self.get_parameters(names)
+        else:
+            values = self.decode_parameters(names, image)
+
+        record = {'SYS': {}, 'PLL': {}, 'MS': {}, 'CLK': {}}
+        for group, x in groups:
+            fields = dict((n, values[n]) for n in status_names(group, x))
+            if x is None:
+                record[group] = fields
+            else:
+                record[group][x] = fields
+
+        return record
+
+    def status_SYS(self, verbose=True):
         """Return device system status information
         """
-        names = ['SYS_INIT', 'CLKIN_DIV', 'XTAL_CL', 'SSC_EN',
-                 'CLKIN_FANOUT_EN', 'XO_FANOUT_EN', 'MS_FANOUT_EN'] 
-        
-        for n in names:
-            print('{:15s}: {}'.format(n, self[n]))
+        values = self.get_parameters(status_names('SYS'))
+        if verbose:
+            print(format_fields(values))
+
+        return values
     
-    def status_PLL(self, x='A'):
+    def status_PLL(self, x='A', verbose=True):
         """Return device PLL status information.
         x = 'A' or 'B'
         """
-        names = ['LOL_{}', 'PLL{}_SRC', 'MSN{}_P1', 'MSN{}_P2', 'MSN{}_P3', 'FB{}_INT']        
-        for n in names:
-            n = n.format(x)
-            print('{:15s}: {}'.format(n, self[n]))
+        values = self.get_parameters(status_names('PLL', x))
+        if verbose:
+            print(format_fields(values))
+
+        return values
     
-    def status_MS(self, x):
+    def status_MS(self, x, verbose=True):
         """Return device multisynth status information
         x = 0, or 1, ... or ... 7
         """
-        if 0 <= x and x <= 5:
-            names = ['MS{}_SRC', 'MS{}_P1', 'MS{}_P2', 'MS{}_P3',
-                     'MS{}_INT', 'MS{}_DIVBY4', 'R{}_DIV']
-        elif 6 <= x and x <= 7:
-            names = ['MS{}_SRC', 'MS{}_P1', 'R{}_DIV']
-        else:
-            raise ValueError('Invalid x: {}'.format(x))
-        
-        for n in names:
-            n = n.format(x)
-            print('{:15s}: {}'.format(n, self[n]))
+        values = self.get_parameters(status_names('MS', x))
+        if verbose:
+            print(format_fields(values))
+
+        return values
     
-    def status_CLK(self, x):
+    def status_CLK(self, x, verbose=True):
         """Return device clock status information
         x = 0, or 1, ... or ... 7
         """
-        if 0 <= x and x <= 5:
-            names = ['CLK{}_PDN', 'CLK{}_OEB', 'CLK{}_SRC',
-                     'CLK{}_PHOFF', 'CLK{}_IDRV', 'CLK{}_INV', 'CLK{}_DIS_STATE']
-        elif 6 <= x and x <= 7:
-            names = ['CLK{}_PDN', 'CLK{}_OEB', 'CLK{}_SRC',
-                     'CLK{}_IDRV', 'CLK{}_INV', 'CLK{}_DIS_STATE']
-        else:
-            raise ValueError('Invalid x: {}'.format(x))
-        
-        for n in names:
-            n = n.format(x)
-            print('{:15s}: {}'.format(n, self[n]))
+        values = self.get_parameters(status_names('CLK', x))
+        if verbose:
+            print(format_fields(values))
+
+        return values
             
     @property
     def parameter_names(self):
@@ -104,49 +203,21 @@ class Clock(device.Device):
         names.sort()
         return names
         
+    def compile_reset(self):
+        """Compile reset_values into the register image applied by reset().
+        Call again after changing reset_values.  The image is a dict of
+        register -> (mask, bits) as returned by pack_parameters(); further
+        entries may be merged into it directly.
+        """
+        self.reset_image = self.pack_parameters(self.reset_values)
+
     def reset(self):
-        """Configure device to default values with all outputs disabled
+        """Configure device to default values with all outputs disabled.
+        Applies the precompiled reset_image: registers fully determined by the reset
+        are written blind, the few partially covered ones are fetched in one bulk
+        read, and everything goes out as a handful of burst writes.
         """
-        # Specify clock state when its disabled
-        self['CLK0_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK1_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK2_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK3_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK4_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK5_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK6_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-        self['CLK7_DIS_STATE'] = constants.CLK_DIS_STATE_LOW
-
-        # Disable all clocks
-        self['CLK0_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK1_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK2_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK3_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK4_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK5_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK6_OEB'] = constants.CLK_OEB_DISABLE
-        self['CLK7_OEB'] = constants.CLK_OEB_DISABLE
-
-        # Power down all output drivers
-        self['CLK0_PDN'] = constants.CLK_PDN_OFF
-        self['CLK1_PDN'] = constants.CLK_PDN_OFF
-        self['CLK2_PDN'] = constants.CLK_PDN_OFF
-        self['CLK3_PDN'] = constants.CLK_PDN_OFF
-        self['CLK4_PDN'] = constants.CLK_PDN_OFF
-        self['CLK5_PDN'] = constants.CLK_PDN_OFF
-        self['CLK6_PDN'] = constants.CLK_PDN_OFF
-        self['CLK7_PDN'] = constants.CLK_PDN_OFF
-
-        # Set interrupt masks to null thus allowing all asserts to go through
-        self['SYS_INIT_MASK'] = 0
-        self['LOL_A_MASK'] = 0
-        self['LOL_B_MASK'] = 0
-        self['LOS_MASK'] = 0 
-
-        # Fanout options
-        self['CLKIN_FANOUT_EN'] = constants.FANOUT_DISABLE
-        self['XO_FANOUT_EN'] =    constants.FANOUT_DISABLE
-        self['MS_FANOUT_EN'] =    constants.FANOUT_DISABLE
+        self.write_image(self.reset_image)
 
     def config_input(self):
         """Configure clock/XTAL input parameters
@@ -172,16 +243,21 @@ class Clock(device.Device):
         elif src.upper() == 'CLKIN':
             self[key] = constants.PLL_SRC_CLKIN
 
-        M_PLL = f_PLL/self.f_XTAL
+        M_PLL = Fraction(f_PLL)/Fraction(self.f_XTAL)
         a, b, c = compute_abc(M_PLL)
         f_PLL_set = (a + b/c)*self.f_XTAL
 
         self.f_PLL[PLL.upper()] = f_PLL_set
+        self._PLL_abc[PLL.upper()] = (a, b, c)
 
+        # P1, P2, P3 span consecutive registers, write them in a single burst
         tpl = 'MSN{:s}_P{:d}'
+        values = {}
         for k, P in enumerate(encode_abc(a, b, c)):
             key = tpl.format(PLL, k+1)
-            self[key] = P
+            values[key] = P
+
+        self.set_parameters(values)
 
         # Even integer?
         key = 'FB{:s}_INT'.format(PLL)
@@ -192,6 +268,16 @@ class Clock(device.Device):
             # No
             self[key] = 0
         
+    def PLL_frequency(self, PLL='A'):
+        """Return exact frequency of PLL as a Fraction, derived from its configured
+        feedback multiplier when known
+        """
+        if PLL in self._PLL_abc:
+            a, b, c = self._PLL_abc[PLL]
+            return Fraction(self.f_XTAL)*(a + Fraction(b, c))
+
+        return Fraction(self.f_PLL[PLL])
+
     def config_MS(self, f_MS, MS, src_PLL='A'):
         """Configure specified MultiSynth
         - Input PLL
@@ -215,18 +301,24 @@ class Clock(device.Device):
             self[key] = constants.MS_DIVBY4_DISABLE
 
         # MS output frequency, f_MS
-        f_PLL = self.f_PLL[src_PLL.upper()]
-        M_MS = f_PLL/f_MS
+        f_PLL = self.PLL_frequency(src_PLL.upper())
+        M_MS = f_PLL/Fraction(f_MS)
 
         a, b, c = compute_abc(M_MS)
-        f_MS_set = f_PLL/(a + b/c)
+        f_MS_set = float(f_PLL/(a + Fraction(b, c)))
         
         self.f_MS[MS] = f_MS_set
+        self.src_PLL[MS] = src_PLL.upper()
+        self._retune_image.pop(MS, None)
         
+        # P1, P2, P3 span consecutive registers, write them in a single burst
         tpl = 'MS{:d}_P{:d}'
+        values = {}
         for k, P in enumerate(encode_abc(a, b, c)):
             key = tpl.format(MS, k+1)
-            self[key] = P
+            values[key] = P
+
+        self.set_parameters(values)
         
         # Even integer?
         key = 'MS{:d}_INT'.format(MS)
@@ -262,6 +354,109 @@ class Clock(device.Device):
         key = 'R{:d}_DIV'.format(ix_CLK)
         self[key] = constants.R_DIV_1
     
+    def plan(self, targets):
+        """Compute frequency plan for several outputs at once.
+        targets : dict of MS index -> desired output frequency, up to all eight outputs
+
+        PLL A/B frequencies and MultiSynth/R dividers are searched together to minimize
+        total frequency error, preferring even integer dividers.  Plans are cached.
+        Return Plan object, pass it to apply() to configure the device.
+        """
+        return planner.plan_outputs(tuple(sorted(targets.items())), self.f_XTAL)
+
+    def apply(self, plan):
+        """Configure PLLs and MultiSynths according to a frequency plan
+        """
+        with self.batch():
+            self.set_parameters(plan.parameters())
+
+        for x, info in plan.PLL.items():
+            self.f_PLL[x] = info['f']
+            self._PLL_abc[x] = info['abc']
+
+        for MS, out in plan.outputs.items():
+            self.f_MS[MS] = out['f']*out['R']
+            self.src_PLL[MS] = out['PLL']
+            self._retune_image.pop(MS, None)
+
+    def retune(self, MS, f_MS):
+        """Fast frequency change of an already configured MultiSynth (0-5).
+        Compute new P1, P2, P3 and integer mode bit, compare with the register bytes
+        last written and send only the changed bytes as a single burst.
+
+        Duration of the call is recorded in retune_latency (seconds), the number of
+        register bytes written in retune_bytes.
+        Return the output frequency actually set.
+        """
+        t0 = time.perf_counter()
+
+        if not 0 <= MS <= 5:
+            raise ValueError('Invalid MS for retune: {}'.format(MS))
+
+        f_PLL = self.PLL_frequency(self.src_PLL.get(MS, 'A'))
+        a, b, c = compute_abc(f_PLL/Fraction(f_MS))
+        f_MS_set = float(f_PLL/(a + Fraction(b, c)))
+
+        values = {}
+        for k, P in enumerate(encode_abc(a, b, c)):
+            values['MS{:d}_P{:d}'.format(MS, k+1)] = P
+        values['MS{:d}_INT'.format(MS)] = int(b == 0 and not a % 2)
+
+        updates = {}
+        for name, value in values.items():
+            self._pack_parameter(name, value, updates)
+
+        with self.lock:
+            image = self._retune_image.get(MS)
+            if image is None:
+                # First retune since configuration, fetch bits outside of the parameters
+                partial = [register for register, (reg_mask, _) in updates.items() if reg_mask != 0xFF]
+                prior = self.read_prior_bytes(partial)
+                image = {}
+                for register, (reg_mask, data_reg_byte) in updates.items():
+                    image[register] = (prior.get(register, 0) & ~reg_mask) | data_reg_byte
+                changed = dict(image)
+            else:
+                changed = {}
+                for register, (reg_mask, data_reg_byte) in updates.items():
+                    data_reg_byte |= image[register] & ~reg_mask
+                    if data_reg_byte != image[register]:
+                        image[register] = data_reg_byte
+                        changed[register] = data_reg_byte
+
+            # Fill gaps between changed bytes of the divider block so they go out as one burst
+            divider = [register for register in changed if register != 16 + MS]
+            if divider:
+                for register in range(min(divider), max(divider)):
+                    changed.setdefault(register, image[register])
+
+            self.write_registers(changed)
+            self._retune_image[MS] = image
+
+        self.f_MS[MS] = f_MS_set
+
+        self.retune_bytes = len(changed)
+        self.retune_latency = time.perf_counter() - t0
+
+        return f_MS_set
+
+    def invalidate(self, registers=None):
+        """Mark shadowed register(s) as stale and forget register bytes remembered by retune()
+        """
+        super().invalidate(registers)
+        self._retune_image = {}
+
+    def _written(self, register, length):
+        """Forget register bytes remembered by retune() once any of them is written
+        elsewhere, e.g. R_DIV, DIVBY4, or CLK control bits sharing its registers.
+        """
+        if not self._retune_image:
+            return
+
+        for MS, image in list(self._retune_image.items()):
+            if any(register <= r < register + length for r in image):
+                del self._retune_image[MS]
+
     def soft_reset_PLL(self, s_PLL):
         key = 'PLL{:s}_RST'.format(s_PLL)
         self[key] = 1
@@ -277,36 +472,211 @@ class Clock(device.Device):
 
 #---------------------------------------------------------------
 
+def status_names(group, x=None):
+    """Parameter names reported for status group 'SYS', 'PLL' (x = 'A' or 'B'),
+    'MS' or 'CLK' (x = 0, or 1, ... or ... 7)
+    """
+    if group == 'SYS':
+        names = ['SYS_INIT', 'CLKIN_DIV', 'XTAL_CL', 'SSC_EN',
+                 'CLKIN_FANOUT_EN', 'XO_FANOUT_EN', 'MS_FANOUT_EN']
+    elif group == 'PLL':
+        if x not in ['A', 'B']:
+            raise ValueError('Invalid x: {}'.format(x))
+        names = ['LOL_{}', 'PLL{}_SRC', 'MSN{}_P1', 'MSN{}_P2', 'MSN{}_P3', 'FB{}_INT']
+    elif group == 'MS':
+        if 0 <= x and x <= 5:
+            names = ['MS{}_SRC', 'MS{}_P1', 'MS{}_P2', 'MS{}_P3',
+                     'MS{}_INT', 'MS{}_DIVBY4', 'R{}_DIV']
+        elif 6 <= x and x <= 7:
+            names = ['MS{}_SRC', 'MS{}_P1', 'R{}_DIV']
+        else:
+            raise ValueError('Invalid x: {}'.format(x))
+    elif group == 'CLK':
+        if 0 <= x and x <= 5:
+            names = ['CLK{}_PDN', 'CLK{}_OEB', 'CLK{}_SRC',
+                     'CLK{}_PHOFF', 'CLK{}_IDRV', 'CLK{}_INV', 'CLK{}_DIS_STATE']
+        elif 6 <= x and x <= 7:
+            names = ['CLK{}_PDN', 'CLK{}_OEB', 'CLK{}_SRC',
+                     'CLK{}_IDRV', 'CLK{}_INV', 'CLK{}_DIS_STATE']
+        else:
+            raise ValueError('Invalid x: {}'.format(x))
+    else:
+        raise ValueError('Invalid status group: {}'.format(group))
+
+    return [n.format(x) for n in names]
+
+def format_fields(values):
+    """Format dict of parameter name -> value, one per line
+    """
+    return '\n'.join('{:15s}: {}'.format(n, value) for n, value in values.items())
+
+def format_status(record):
+    """Format status record from Clock.read_status() for printing
+    """
+    blocks = [format_fields(record['SYS'])]
+    for group in ['PLL', 'MS', 'CLK']:
+        for x, values in record[group].items():
+            blocks.append(format_fields(values))
+
+    return '\n\n'.join(blocks)
+
+# Bound on cached compute_abc/encode_abc results, channel frequencies recur constantly
+ABC_CACHE_SIZE = 4096
+
+# Version of persistently cached results, change whenever the divider math or
+# the planner produce different results
+CACHE_VERSION = '1'
+
+@memoize.memoize(maxsize=ABC_CACHE_SIZE, single_flight=True)
 def compute_abc(value):
     """Decompse supplied value as integers: a + b/c
+    value : int, Fraction, or float (taken at its exact binary value)
+
+    b/c is the best rational approximation of the fractional part with
+    denominator c <= C_MAX, computed in exact arithmetic.
     """
-    eps = 1e-10
-    
-    a = int(value)
-    if abs(value - a) < eps:
-        # Easy
-        b = 0
-        c = 1
-    else:
-        # Rational fractions approximation
-        lohi_b = [0, 2**20]
-        lohi_c = [1, 2**20]
+    value = Fraction(value)
+
+    a = math.floor(value)
+    frac = (value - a).limit_denominator(constants.C_MAX)
+    b = frac.numerator
+    c = frac.denominator
 
-        b, c = rational_approximation((value-a), lohi_num=lohi_b, lohi_den=lohi_c)
+    if b == c:
+        # Fractional part rounded up to one
+        a, b, c = a + 1, 0, 1
     
     return a, b, c
     
+@memoize.memoize(maxsize=ABC_CACHE_SIZE)
 def encode_abc(a, b, c):
     """Encode a, b, and c parameters as P1, P2, and P3 register values
     """
-    P1 = 128*a + np.floor(128*b/c) - 512
-    P2 = 128*b - c*np.floor(128*b/c)
+    a = int(a)
+    b = int(b)
+    c = int(c)
+
+    floor_b = (128*b)//c
+
+    P1 = 128*a + floor_b - 512
+    P2 = 128*b - c*floor_b
     P3 = c
     
-    P1 = int(P1)
-    P2 = int(P2)
-    P3 = int(P3)
-    
+    return P1, P2, P3
+
+def cache_info():
+    """Return dict of function name -> CacheInfo for the memoized divider math and planner
+    """
+    return {'compute_abc': compute_abc.cache_info(),
+            'encode_abc': encode_abc.cache_info(),
+            'plan_outputs': planner.plan_outputs.cache_info()}
+
+def clear_caches():
+    """Discard all cached divider results and frequency plans
+    """
+    compute_abc.cache_clear()
+    encode_abc.cache_clear()
+    planner.plan_outputs.cache_clear()
+
+def persist_caches(store):
+    """Back the divider math and planner caches with a persistent store shared by
+    all processes on the host, None to detach, e.g.
+
+        clock.persist_caches(memoize.SQLiteStore('/var/cache/snail.sqlite'))
+    """
+    for func in [compute_abc, encode_abc, planner.plan_outputs]:
+        func.set_store(store, CACHE_VERSION)
+
+def compute_abc_batch(values):
+    """Vectorized compute_abc over an array of values (each >= 1).
+    Same result as compute_abc applied to each float value: the best approximation
+    of the fractional part with denominator c <= C_MAX, via a continued fraction
+    expansion run on all elements at once in exact int64 arithmetic.
+    Return a, b, c int64 arrays.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    if not np.all(np.isfinite(values)) or np.any(values < 1):
+        raise ValueError('Values must be finite and >= 1')
+
+    C_MAX = constants.C_MAX
+
+    # Fractional part as exact ratio n/d, d = 2**52
+    a = np.floor(values)
+    n = ((values - a)*2.0**52).astype(np.int64)
+    d = np.full(n.shape, 2**52, dtype=np.int64)
+    a = a.astype(np.int64)
+
+    # Convergents p0/q0, p1/q1 of n/d
+    p0 = np.zeros(n.shape, dtype=np.int64)
+    q0 = np.ones(n.shape, dtype=np.int64)
+    p1 = np.ones(n.shape, dtype=np.int64)
+    q1 = np.zeros(n.shape, dtype=np.int64)
+
+    running = n != 0
+    bounded = np.zeros(n.shape, dtype=bool)
+    while np.any(running):
+        q = n//np.where(running, d, 1)
+        q = np.minimum(q, C_MAX + 1)  # large enough to exceed the bound, avoids overflow
+        q2 = q0 + q*q1
+
+        step = running & (q2 <= C_MAX)
+        bounded |= running & ~step
+
+        p0, p1 = np.where(step, p1, p0), np.where(step, p0 + q*p1, p1)
+        q0, q1 = np.where(step, q1, q0), np.where(step, q2, q1)
+        n, d = np.where(step, d, n), np.where(step, n - q*d, d)
+
+        running = step & (d != 0)
+
+    b = np.where(n != 0, p1, 0)
+    c = np.where(n != 0, q1, 1)
+
+    # Expansion stopped by the bound: choose between last convergent p1/q1 and the
+    # largest admissible semiconvergent, comparing errors through the remainder n/d
+    ix = np.nonzero(bounded)[0]
+    if len(ix):
+        k = (C_MAX - q0[ix])//q1[ix]
+        lhs = (q0[ix] + k*q1[ix]).astype(np.float64)
+        rhs = q1[ix]*(n[ix]/d[ix] - k)
+
+        use_convergent = lhs <= rhs
+
+        # Recheck near-ties in exact integer arithmetic
+        for j in np.nonzero(np.abs(lhs - rhs) <= 1e-9*lhs)[0]:
+            i = ix[j]
+            K = int(k[j])
+            use_convergent[j] = ((int(q0[i]) + K*int(q1[i]))*int(d[i]) <=
+                                 int(q1[i])*(int(n[i]) - K*int(d[i])))
+
+        b[ix] = np.where(use_convergent, p1[ix], p0[ix] + k*p1[ix])
+        c[ix] = np.where(use_convergent, q1[ix], q0[ix] + k*q1[ix])
+
+    # Fractional part rounded up to one
+    up = b == c
+    a = np.where(up, a + 1, a)
+    b = np.where(up, 0, b)
+    c = np.where(up, 1, c)
+
+    return a, b, c
+
+def encode_abc_batch(a, b, c):
+    """Vectorized encode_abc over arrays of a, b, and c.
+    Return P1, P2, P3 int64 arrays.
+    """
+    import numpy as np
+
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    c = np.asarray(c, dtype=np.int64)
+
+    floor_b = (128*b)//c
+
+    P1 = 128*a + floor_b - 512
+    P2 = 128*b - c*floor_b
+    P3 = c
+
     return P1, P2, P3
 
 #------------------------------------------
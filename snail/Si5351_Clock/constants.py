@@ -81,6 +81,19 @@ R_DIV_128 = 0b111
 FANOUT_ENABLE =  0b1
 FANOUT_DISABLE = 0b0
 
+##########################################
+# Frequency plan limits
+F_PLL_MIN = 600e6   # PLL VCO range (Hz)
+F_PLL_MAX = 900e6
+
+MS_DIV_MIN = 8      # MultiSynth 0-5 divider range, fractional allowed
+MS_DIV_MAX = 2048
+
+MS67_DIV_MIN = 6    # MultiSynth 6-7 divider range, even integers only
+MS67_DIV_MAX = 254
+
+C_MAX = 2**20 - 1   # Largest denominator c of a + b/c (20-bit P3 field)
+
 #-----------------------------------------
 if __name__ == '__main__':
     pass
@@ -0,0 +1,243 @@
+"""
+Frequency planning for multiple Si5351 outputs.
+
+Search PLL A/B frequencies and MultiSynth/R divider assignments hitting a set of
+requested output frequencies with the least total error, preferring even integer
+dividers (lower jitter, integer mode) wherever that costs no accuracy.
+"""
+
+import math
+from fractions import Fraction
+
+from .. import memoize
+from .  import constants
+from .  import clock
+
+
+# Divider preference penalties, lower is better
+PENALTY_EVEN = 0
+PENALTY_INTEGER = 1
+PENALTY_FRACTIONAL = 2
+
+# Errors closer than this (ppm) are considered equal when ranking plans
+PPM_TOLERANCE = 1e-3
+
+# Weight of one PPM_TOLERANCE step of error relative to the divider penalties
+PENALTY_SCALE = 16
+
+R_DIVs = [1, 2, 4, 8, 16, 32, 64, 128]
+
+# Bound on the number of cached frequency plans
+PLAN_CACHE_SIZE = 256
+
+
+
+class Plan():
+    """Frequency plan for the PLLs and MultiSynth outputs of the Si5351.
+
+    PLL : dict 'A'/'B' -> dict(f, abc) for each PLL used by the plan
+    outputs : dict MS index -> dict(f_target, f, PLL, abc, R, ppm, penalty)
+    ppm : total absolute frequency error over all outputs, parts per million
+    """
+    def __init__(self, f_XTAL, PLL, outputs):
+        self.f_XTAL = f_XTAL
+        self.PLL = PLL
+        self.outputs = outputs
+
+        self.ppm = sum(out['ppm'] for out in outputs.values())
+        self.penalty = sum(out['penalty'] for out in outputs.values())
+
+    def __repr__(self):
+        PLL = ', '.join('{}={:.6f} MHz'.format(x, info['f']/1e6) for x, info in sorted(self.PLL.items()))
+        return 'Plan({}, outputs={}, ppm={:.3g})'.format(PLL, sorted(self.outputs), self.ppm)
+
+    def parameters(self):
+        """Return dict of device parameter values implementing this plan
+        """
+        values = {}
+        for x, info in self.PLL.items():
+            a, b, c = info['abc']
+            for k, P in enumerate(clock.encode_abc(a, b, c)):
+                values['MSN{:s}_P{:d}'.format(x, k+1)] = P
+            values['FB{:s}_INT'.format(x)] = int(b == 0 and not a % 2)
+
+        for MS, out in self.outputs.items():
+            a, b, c = out['abc']
+            if out['PLL'] == 'A':
+                values['MS{:d}_SRC'.format(MS)] = constants.MS_SRC_PLL_A
+            else:
+                values['MS{:d}_SRC'.format(MS)] = constants.MS_SRC_PLL_B
+
+            values['R{:d}_DIV'.format(MS)] = R_DIVs.index(out['R'])
+
+            if MS <= 5:
+                for k, P in enumerate(clock.encode_abc(a, b, c)):
+                    values['MS{:d}_P{:d}'.format(MS, k+1)] = P
+                values['MS{:d}_INT'.format(MS)] = int(b == 0 and not a % 2)
+                values['MS{:d}_DIVBY4'.format(MS)] = constants.MS_DIVBY4_DISABLE
+            else:
+                # MS6 and MS7 hold the even integer divider directly
+                values['MS{:d}_P1'.format(MS)] = a
+
+        return values
+
+
+
+def divider_limits(MS):
+    """Return (min, max) MultiSynth divider for output MS
+    """
+    if 0 <= MS <= 5:
+        return constants.MS_DIV_MIN, constants.MS_DIV_MAX
+    elif 6 <= MS <= 7:
+        return constants.MS67_DIV_MIN, constants.MS67_DIV_MAX
+    else:
+        raise ValueError('Invalid MS: {}'.format(MS))
+
+
+
+def choose_R(f, MS):
+    """Return smallest R divider placing the MultiSynth output within reach of the PLL
+    """
+    lo, hi = divider_limits(MS)
+    for R in R_DIVs:
+        if f*R*hi >= constants.F_PLL_MIN:
+            return R
+
+    raise ValueError('Output frequency too low: {}'.format(f))
+
+
+
+def candidate_PLLs(f, MS, R):
+    """PLL frequencies giving output MS an even integer divider
+    """
+    lo, hi = divider_limits(MS)
+    g = f*R
+
+    d_lo = max(lo, int(constants.F_PLL_MIN // g))
+    d_hi = min(hi, int(constants.F_PLL_MAX // g))
+
+    candidates = []
+    for d in range(d_lo + d_lo % 2, d_hi + 1, 2):
+        f_PLL = d*g
+        if constants.F_PLL_MIN <= f_PLL <= constants.F_PLL_MAX:
+            candidates.append(f_PLL)
+
+    if not candidates:
+        raise ValueError('Output frequency out of range for MS{}: {}'.format(MS, f))
+
+    return candidates
+
+
+
+def configure_PLL(f_PLL, f_XTAL):
+    """Return achievable PLL frequency (exact Fraction) and its (a, b, c) feedback multiplier
+    """
+    a, b, c = clock.compute_abc(Fraction(f_PLL)/Fraction(f_XTAL))
+
+    return (a + Fraction(b, c))*Fraction(f_XTAL), (a, b, c)
+
+
+
+def configure_output(f_PLL, f, MS, R):
+    """Best divider from PLL frequency to output frequency.
+    Return dict(f, abc, ppm, penalty), or None if the divider is out of range.
+    """
+    lo, hi = divider_limits(MS)
+    g = f*R
+
+    if MS <= 5:
+        a, b, c = clock.compute_abc(f_PLL/Fraction(g))
+    else:
+        # Nearest even integer
+        a = round(f_PLL/Fraction(g)/2)*2
+        b, c = 0, 1
+
+    divider = a + Fraction(b, c)
+    if divider < lo or divider > hi:
+        return None
+
+    f_set = f_PLL/divider/R
+    if b:
+        penalty = PENALTY_FRACTIONAL
+    elif a % 2:
+        penalty = PENALTY_INTEGER
+    else:
+        penalty = PENALTY_EVEN
+
+    return {'f': float(f_set),
+            'abc': (a, b, c),
+            'ppm': float(abs(f_set - Fraction(f))/Fraction(f))*1e6,
+            'penalty': penalty}
+
+
+
+@memoize.memoize(maxsize=PLAN_CACHE_SIZE, single_flight=True)
+def plan_outputs(targets, f_XTAL):
+    """Search PLL frequencies and divider assignments for requested outputs.
+
+    targets : tuple of (MS index, frequency) pairs, up to all eight outputs
+    f_XTAL : reference frequency
+
+    Candidate PLL frequencies are those giving some output an even integer
+    divider.  Every pair of candidates is scored with each output on its
+    better PLL; the plan with least total ppm error wins, ties going to the
+    fewest fractional or odd dividers.
+    """
+    targets = tuple(sorted(targets))
+    if not targets:
+        raise ValueError('No outputs requested')
+
+    R = {}
+    candidates = set()
+    for MS, f in targets:
+        R[MS] = choose_R(f, MS)
+        candidates.update(candidate_PLLs(f, MS, R[MS]))
+
+    # Score every candidate PLL frequency against every output.  Per-output cost is
+    # the error in units of PPM_TOLERANCE, with the divider penalty breaking ties.
+    scored = []
+    for f_PLL in sorted(candidates):
+        f_PLL, abc = configure_PLL(f_PLL, f_XTAL)
+        outputs = [configure_output(f_PLL, f, MS, R[MS]) for MS, f in targets]
+        costs = [math.inf if out is None else
+                 round(out['ppm']/PPM_TOLERANCE)*PENALTY_SCALE + out['penalty'] for out in outputs]
+        cost_PLL = 0 if abc[1] == 0 and not abc[0] % 2 else PENALTY_INTEGER
+        scored.append((f_PLL, abc, outputs, costs, cost_PLL))
+
+    # Each output takes the better of the two PLLs
+    best = None
+    for i, (f_A, abc_A, out_A, cost_A, pen_A) in enumerate(scored):
+        for j in range(i, len(scored)):
+            f_B, abc_B, out_B, cost_B, pen_B = scored[j]
+            cost = sum(map(min, cost_A, cost_B)) + pen_A + (pen_B if j != i else 0)
+            if best is None or cost < best[0]:
+                best = (cost, i, j)
+
+    if best is None or best[0] == math.inf:
+        raise ValueError('No frequency plan found for: {}'.format(targets))
+
+    cost, i, j = best
+    PLL_A = scored[i]
+    PLL_B = scored[j]
+
+    PLL = {}
+    outputs = {}
+    for k, (MS, f) in enumerate(targets):
+        if PLL_A[3][k] <= PLL_B[3][k]:
+            x, (f_PLL, abc, out, _, _) = 'A', PLL_A
+        else:
+            x, (f_PLL, abc, out, _, _) = 'B', PLL_B
+
+        PLL[x] = {'f': float(f_PLL), 'abc': abc}
+
+        outputs[MS] = dict(out[k])
+        outputs[MS].update({'f_target': f, 'PLL': x, 'R': R[MS]})
+
+    return Plan(f_XTAL, PLL, outputs)
+
+
+
+
+#------------------------------------------
+if __name__ == '__main__':
+    pass
@@ -1,4 +1,4 @@
-import numpy as np
+import math
 
 """
 Inspired by this snippet: http://code.activestate.com/recipes/542190-rational-approximations
@@ -13,7 +13,8 @@ def chain(x):
         a = int(x)
         d = x-a
         if abs(d) < eps:
-            # print('zero')
+            # Exact, a is the last term
+            yield a
             return
         try:
             yield a
@@ -24,53 +25,77 @@ def chain(x):
 
 
 
-def eval_chain(fractions):
-    """Compute best rational approximation of a sequence of fractions
+def eval_chain(fractions, max_num=math.inf, max_den=math.inf):
+    """Compute best rational approximations of a sequence of fractions.
+    Generate the convergents (numerator, denominator) within max_num and max_den.
+    When the next convergent would exceed a bound, the largest admissible
+    semiconvergent is solved for directly and generated last, instead of
+    scanning every semiconvergent in turn.
     """
     n1, n2 = 1, 0
     d1, d2 = 0, 1
     for a in fractions:
-        # print('a', a)
-        for b in range(int((a+1)/2), a+1):
-            yield (b*n1+n2, b*d1+d2)
+        n, d = a*n1+n2, a*d1+d2
+        if n > max_num or d > max_den:
+            # Largest b with b*n1+n2 <= max_num and b*d1+d2 <= max_den
+            b = a
+            if n > max_num:
+                if n1 == 0:
+                    # Numerator does not depend on b, no semiconvergent fits
+                    return
+                b = min(b, (max_num - n2)//n1)
+            if d > max_den:
+                if d1 == 0:
+                    return
+                b = min(b, (max_den - d2)//d1)
+            b = int(b)
+
+            if b >= int((a+1)/2):
+                yield (b*n1+n2, b*d1+d2)
+            return
+
+        yield (n, d)
+
+        n1, n2 = n, n1
+        d1, d2 = d, d1
+
 
-        n1, n2 = a*n1+n2, n1
-        d1, d2 = a*d1+d2, d1
 
-        
-        
 def rational_approximation(value, max_num=None, max_den=None,
-                           lohi_num=[0, np.inf], lohi_den=[1, np.inf],
+                           lohi_num=(0, math.inf), lohi_den=(1, math.inf),
                            max_iter=1e6):
-    """Compute best rational approximation of a fraction via continued fraction series
+    """Compute best rational approximation of a fraction via continued fraction series.
+    Cost is proportional to the number of continued fraction terms, O(log max_den).
+    max_iter bounds the number of terms considered.
     """
     eps = 1.e-20
+    lo_num, hi_num = lohi_num
+    lo_den, hi_den = lohi_den
     if max_num:
-        lohi_num[1] = max_num
-        
+        hi_num = max_num
+
     if max_den:
-        lohi_den[1] = max_den
-        
-    n2, d2 = int(value), 1
+        hi_den = max_den
+
+    best = None
     count = 0
-    for n1, d1 in eval_chain(chain(value)):
+    for n1, d1 in eval_chain(chain(value), hi_num, hi_den):
         count += 1
         if count > max_iter:
             raise ValueError('Max iterations exceeded.')
 
-        if lohi_num[0] <= n2 and lohi_den[0] <= d2:
-            if n1 > lohi_num[1] or d1 > lohi_den[1]:
-                # Finish if exceeded either max threshold
-                # print('over, iter', count)
-                return n2, d2
-            elif abs(value - n2/d2) <= eps:
-                # Finish if results are good enough
-                # print('good, iter', count)
-                return n2, d2
-            else:
-                pass
-            
-        n2, d2 = n1, d1
+        if n1 < lo_num or d1 < lo_den:
+            continue
+
+        if best is None or abs(value - n1/d1) <= abs(value - best[0]/best[1]):
+            best = n1, d1
+
+        if abs(value - n1/d1) <= eps:
+            # Finish if results are good enough
+            break
 
     # Done.
-    return n2, d2
+    if best is None:
+        return int(value), 1
+
+    return best
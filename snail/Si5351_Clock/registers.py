@@ -2,6 +2,10 @@
 name = 'Si5351'
 address = 0x60
 
+# Registers whose contents change underneath us (status flags, self-clearing
+# reset bits).  These are never served from a shadow register image.
+volatile = [0, 1, 177]
+
 parameters = {'SYS_INIT': [{'register': 0,
                             'reg_MSB':  7,
                             'reg_LSB':  7}],
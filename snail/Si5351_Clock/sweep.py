@@ -0,0 +1,150 @@
+"""
+Precomputed frequency sweeps.
+
+All divider math for a sweep is done up front: each step's MultiSynth register
+bytes are packed into one compact table, and playback only streams the table to
+the bus, one block write per step.
+"""
+
+import array
+from fractions import Fraction
+
+from .clock import compute_abc, encode_abc
+
+# Sweeps use the divider math uncached: thousands of one-off steps would evict the
+# cached results retune() and config_*() rely on, and pay the cache overhead for nothing
+compute_abc = compute_abc.__wrapped__
+encode_abc = encode_abc.__wrapped__
+
+
+class SweepTable():
+    """Register payloads for sweeping one MultiSynth over a list of frequencies.
+
+    MS : MultiSynth index
+    register : first register of each payload
+    width : number of register bytes per step
+    payload : bytes, width bytes per step
+    frequencies : array of output frequencies actually produced at each step
+    """
+    def __init__(self, MS, register, width, payload, frequencies):
+        self.MS = MS
+        self.register = register
+        self.width = width
+        self.payload = payload
+        self.frequencies = frequencies
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def __getitem__(self, k):
+        """Register bytes for step k
+        """
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('Sweep step out of range: {}'.format(k))
+
+        return self.payload[k*self.width:(k+1)*self.width]
+
+    def __repr__(self):
+        return 'SweepTable(MS={}, steps={})'.format(self.MS, len(self))
+
+
+
+def compile_sweep(clock, MS, frequencies):
+    """Precompute register payloads sweeping MultiSynth MS (0-5) over frequencies.
+    The MultiSynth must already be configured, its source PLL frequency and the
+    R divider / divide-by-4 bits sharing its registers are taken from the device.
+    Return SweepTable.
+    """
+    if not 0 <= MS <= 5:
+        raise ValueError('Invalid MS for sweep: {}'.format(MS))
+
+    f_PLL = clock.PLL_frequency(clock.src_PLL.get(MS, 'A'))
+    names = ['MS{:d}_P{:d}'.format(MS, k+1) for k in range(3)]
+
+    # Register span of P1, P2, P3 and the bits in it belonging to other parameters
+    updates = {}
+    for name in names:
+        clock._pack_parameter(name, 0, updates)
+
+    register = min(updates)
+    width = max(updates) - register + 1
+
+    partial = [r for r, (reg_mask, _) in updates.items() if reg_mask != 0xFF]
+    prior = clock.read_prior_bytes(partial)
+
+    payload = bytearray()
+    f_set = array.array('d')
+    for f in frequencies_iter(frequencies):
+        a, b, c = compute_abc(f_PLL/Fraction(f))
+
+        updates = {}
+        for name, P in zip(names, encode_abc(a, b, c)):
+            clock._pack_parameter(name, P, updates)
+
+        row = bytearray(width)
+        for r, (reg_mask, data_reg_byte) in updates.items():
+            row[r - register] = (prior.get(r, 0) & ~reg_mask) | data_reg_byte
+
+        payload.extend(row)
+        f_set.append(f_PLL/(a + Fraction(b, c)))
+
+    return SweepTable(MS, register, width, bytes(payload), f_set)
+
+
+
+def frequencies_iter(frequencies):
+    """Iterate over sweep frequencies as floats
+    """
+    for f in frequencies:
+        f = float(f)
+        if f <= 0:
+            raise ValueError('Frequency must be positive: {}'.format(f))
+
+        yield f
+
+
+
+def play(clock, table, repeat=False):
+    """Generator streaming a precomputed sweep to the device.
+    Each step is a single block write; the index of the step just written is
+    yielded so the caller controls pacing, e.g.
+
+        for k in play(clock, table):
+            time.sleep(dwell)
+
+    The MultiSynth is switched to fractional mode before the first step.  Steps
+    bypass the shadow image, which is invalidated for the sweep registers when
+    playback ends.
+    """
+    clock['MS{:d}_INT'.format(table.MS)] = 0
+
+    write = clock._bus.write_i2c_block_data
+    lock = clock.lock
+    address = clock._address
+    register = table.register
+    width = table.width
+    payload = table.payload
+    N = len(table)
+
+    k = None
+    try:
+        while True:
+            for k in range(N):
+                with lock:
+                    write(address, register, payload[k*width:(k+1)*width])
+                yield k
+
+            if not repeat or not N:
+                break
+    finally:
+        clock.invalidate(range(register, register + width))
+        if k is not None:
+            clock.f_MS[table.MS] = table.frequencies[k]
+
+
+
+#------------------------------------------
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,175 @@
+"""
+asyncio interface to Device and Clock.
+
+Blocking bus I/O runs on a single worker thread per bus, shared by every asyncio
+device on that bus, so the event loop never waits on an I2C transaction.
+set_parameter() calls queued while the bus is busy are merged into a single
+set_parameters() call.  This module imports asyncio; the rest of the package
+does not.
+"""
+
+import asyncio
+import functools
+import concurrent.futures
+
+from . import device
+from .Si5351_Clock import clock
+
+
+def bus_executor(handle):
+    """Return the single-thread executor running I/O for BusHandle handle
+    """
+    with handle.lock:
+        if handle.executor is None:
+            handle.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='snail-bus')
+
+        return handle.executor
+
+
+
+class AsyncDevice():
+    """asyncio counterpart of Device, same constructor arguments.
+    The wrapped Device is available as .device.
+    """
+    def __init__(self, *args, **kwargs):
+        self.device = self._make_device(*args, **kwargs)
+        self._executor = bus_executor(self.device._handle)
+
+        # set_parameter() values waiting for the bus, and the future of their write
+        self._queued = None
+        self._written = None
+        self._draining = False
+
+    def _make_device(self, *args, **kwargs):
+        return device.Device(*args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Run blocking func(*args, **kwargs) on the bus worker thread, after any
+        queued parameter writes.  Return its result.
+        """
+        await self.flush()
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _drain(self):
+        """Write queued parameter values until the queue stays empty
+        """
+        try:
+            while self._queued:
+                values, written = self._queued, self._written
+                self._queued = None
+                self._written = None
+
+                loop = asyncio.get_running_loop()
+                try:
+                    await loop.run_in_executor(self._executor, self.device.set_parameters, values)
+                except Exception as error:
+                    written.set_exception(error)
+                else:
+                    written.set_result(None)
+        finally:
+            self._draining = False
+
+    async def set_parameters(self, values):
+        """Queue parameter values for writing, merged with other values queued before
+        the bus is free.  Later values for the same parameter replace earlier ones.
+        Return once the values are written.
+
+        Values are checked before they are queued, so unknown names or invalid
+        values raise here and never hold up other callers' writes.
+        """
+        self.device.pack_parameters(values)
+
+        if self._queued is None:
+            self._queued = {}
+            self._written = asyncio.get_running_loop().create_future()
+
+        self._queued.update(values)
+        written = self._written
+
+        if not self._draining:
+            self._draining = True
+            asyncio.ensure_future(self._drain())
+
+        await asyncio.shield(written)
+
+    async def set_parameter(self, name, value):
+        await self.set_parameters({name: value})
+
+    async def get_parameter(self, name):
+        return await self.run(self.device.get_parameter, name)
+
+    async def get_parameters(self, names):
+        return await self.run(self.device.get_parameters, names)
+
+    async def flush(self):
+        """Wait until all queued parameter writes are done.
+        Errors from those writes are raised to the callers that queued them, not here.
+        """
+        if self._written is not None:
+            await asyncio.wait([self._written])
+
+    def close(self):
+        self.device.close()
+
+
+
+class AsyncClock(AsyncDevice):
+    """asyncio counterpart of Clock, same constructor arguments.
+    The wrapped Clock is available as .clock (and .device).
+    """
+    def _make_device(self, *args, **kwargs):
+        return clock.Clock(*args, **kwargs)
+
+    @property
+    def clock(self):
+        return self.device
+
+    async def status(self, verbose=False):
+        """Return status record, printed from the bus thread only if verbose
+        """
+        return await self.run(self.device.status, verbose=verbose)
+
+    async def read_status(self, image=None):
+        return await self.run(self.device.read_status, image)
+
+    async def reset(self):
+        await self.run(self.device.reset)
+
+    async def config_input(self):
+        await self.run(self.device.config_input)
+
+    async def config_PLL(self, f_PLL, PLL='A', src='XTAL', force_integer=False):
+        return await self.run(self.device.config_PLL, f_PLL, PLL=PLL, src=src, force_integer=force_integer)
+
+    async def config_MS(self, f_MS, MS, src_PLL='A'):
+        return await self.run(self.device.config_MS, f_MS, MS, src_PLL=src_PLL)
+
+    async def config_CLK(self, ix_CLK):
+        await self.run(self.device.config_CLK, ix_CLK)
+
+    async def plan(self, targets):
+        # CPU only, keep it off the bus thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.device.plan, targets)
+
+    async def apply(self, plan):
+        await self.run(self.device.apply, plan)
+
+    async def retune(self, MS, f_MS):
+        return await self.run(self.device.retune, MS, f_MS)
+
+    async def soft_reset_PLL(self, s_PLL):
+        await self.run(self.device.soft_reset_PLL, s_PLL)
+
+    async def enable_output(self, ix_CLK):
+        await self.run(self.device.enable_output, ix_CLK)
+
+
+
+#---------------------------------------------------
+if __name__ == '__main__':
+    pass
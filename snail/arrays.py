@@ -0,0 +1,109 @@
+"""
+Vectorized bitfield helpers operating on whole NumPy arrays of values.
+
+Array counterparts of device.pack_bits/unpack_bits, plus parameter-level encoding
+of value columns into register bytes and decoding of register images back into
+values.  This module imports NumPy; the rest of the package does not.
+"""
+
+import numpy as np
+
+from .device import mask
+
+
+def pack_bits(data_bits, MSB, LSB):
+    """Pack array of unsigned-integer data values into zero-padded bitfields
+    """
+    data_bits = np.asarray(data_bits, dtype=np.int64)
+    if np.any(data_bits < 0):
+        raise ValueError('data_bits must be non-negative')
+
+    return (data_bits << LSB) & mask(MSB, LSB)
+
+
+
+def unpack_bits(data_binary, MSB, LSB):
+    """Extract bits between MSB and LSB (inclusive) from array of values
+    """
+    data_binary = np.asarray(data_binary, dtype=np.int64)
+    if np.any(data_binary < 0):
+        raise ValueError('data_binary must be non-negative')
+
+    return (data_binary & mask(MSB, LSB)) >> LSB
+
+
+
+def encode(device, values):
+    """Encode columns of parameter values into register bytes.
+
+    device : Device providing the parameter layouts
+    values : dict of parameter name (or handle) -> array of N values, or scalar
+
+    Return registers, data, masks:
+        registers : sorted tuple of the R registers touched by the parameters
+        data : uint8 array, shape (N, R), register bytes with all parameter bits set
+        masks : uint8 array, shape (R,), bits of each register covered by the parameters
+    """
+    columns = {}
+    for name, column in values.items():
+        column = np.asarray(column, dtype=np.int64)
+        if np.any(column < 0):
+            raise ValueError('Only unsigned integers allowed: {}'.format(name))
+
+        columns[name] = column
+
+    registers = set()
+    for name in columns:
+        registers.update(device.layout(name).registers)
+    registers = tuple(sorted(registers))
+    index = dict((register, k) for k, register in enumerate(registers))
+
+    # Scalar columns broadcast against the others, a lone scalar encodes a single row
+    try:
+        shape = np.broadcast_shapes(*(column.shape for column in columns.values()))
+    except ValueError:
+        raise ValueError('Value columns must have matching lengths')
+    if len(shape) > 1:
+        raise ValueError('Value columns must be 1-D, got shape {}'.format(shape))
+    N = shape[0] if shape else (1 if columns else 0)
+    data = np.zeros((N, len(registers)), dtype=np.int64)
+    masks = np.zeros(len(registers), dtype=np.int64)
+
+    for name, column in columns.items():
+        for register, reg_shift, reg_mask, dat_shift in device.layout(name).fields:
+            k = index[register]
+            data[:, k] = (data[:, k] & ~reg_mask) | (((column >> dat_shift) << reg_shift) & reg_mask)
+            masks[k] |= reg_mask
+
+    return registers, data.astype(np.uint8), masks.astype(np.uint8)
+
+
+
+def decode(device, name, images, registers=None):
+    """Decode parameter values from a stack of register images.
+
+    images : array, shape (N, M), one register image per row
+    registers : register number held by each of the M columns.  Default is
+                column index equals register number, e.g. rows from Device.snapshot().
+
+    Return int64 array of N values.
+    """
+    images = np.atleast_2d(np.asarray(images, dtype=np.int64))
+
+    if registers is None:
+        index = None
+    else:
+        index = dict((register, k) for k, register in enumerate(registers))
+
+    value = np.zeros(images.shape[0], dtype=np.int64)
+    for register, reg_shift, reg_mask, dat_shift in device.layout(name).fields:
+        k = register if index is None else index[register]
+        value |= ((images[:, k] & reg_mask) >> reg_shift) << dat_shift
+
+    return value
+
+
+
+#---------------------------------------------------
+if __name__ == '__main__':
+    pass
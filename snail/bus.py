@@ -0,0 +1,160 @@
+"""
+Bus backends for Device.
+
+A backend is any object providing the smbus2.SMBus subset used by Device:
+
+    read_byte_data(address, register)
+    write_byte_data(address, register, value)
+    read_i2c_block_data(address, register, length)
+    write_i2c_block_data(address, register, data)
+
+smbus2 is only imported when a real bus is opened by number.
+
+Devices on the same bus share one pooled BusHandle from acquire(): one backend
+connection and one lock serializing every transaction on that bus.
+"""
+
+import threading
+
+methods = ['read_byte_data', 'write_byte_data',
+           'read_i2c_block_data', 'write_i2c_block_data']
+
+
+class MemoryBus():
+    """In-memory register files standing in for an I2C/SMBus bus.
+    Each device address gets its own register file, created on first access.
+    """
+    def __init__(self, size=256):
+        self._size = size
+        self._files = {}
+
+    def register_file(self, address):
+        """Return bytearray holding the registers of device at address
+        """
+        if address not in self._files:
+            self._files[address] = bytearray(self._size)
+
+        return self._files[address]
+
+    def read_byte_data(self, address, register):
+        return self.register_file(address)[register]
+
+    def write_byte_data(self, address, register, value):
+        self.register_file(address)[register] = value
+
+    def read_i2c_block_data(self, address, register, length):
+        return list(self.register_file(address)[register:register+length])
+
+    def write_i2c_block_data(self, address, register, data):
+        self.register_file(address)[register:register+len(data)] = bytes(data)
+
+    def close(self):
+        pass
+
+
+
+def SMBus(bus):
+    """Open real I2C/SMBus bus by number
+    """
+    import smbus2
+
+    return smbus2.SMBus(bus)
+
+
+
+def check_backend(backend):
+    """Make sure supplied object provides the methods Device relies on
+    """
+    for name in methods:
+        if not callable(getattr(backend, name, None)):
+            raise TypeError('Bus backend is missing method {}: {!r}'.format(name, backend))
+
+
+
+class BusHandle():
+    """Reference counted bus backend shared by all devices on one bus.
+    lock : RLock held for every transaction, and by devices for whole
+           read-modify-write cycles
+    executor : single worker thread running the bus I/O of asyncio devices,
+               created on demand by snail.aio
+    """
+    def __init__(self, backend, key=None, owned=True):
+        self.backend = backend
+        self.key = key
+        self.owned = owned
+        self.lock = threading.RLock()
+        self.refs = 0
+        self.executor = None
+
+    def __repr__(self):
+        return 'BusHandle({!r}, refs={})'.format(self.backend, self.refs)
+
+
+
+# Open bus handles keyed by bus number, or id() of a user-supplied backend
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+
+def acquire(bus, debug=False):
+    """Return shared BusHandle for bus.
+    bus : bus number for a real SMBus, or a user-supplied backend object
+    debug : use a fresh in-memory register file instead of the real bus
+
+    Every device on the same bus number (or backend object) gets the same handle.
+    Debug devices each get their own in-memory register file, as before.
+    Pair with release().
+    """
+    if debug:
+        handle = BusHandle(MemoryBus())
+        handle.refs = 1
+        return handle
+
+    if isinstance(bus, int):
+        key = bus
+    else:
+        check_backend(bus)
+        key = ('backend', id(bus))
+
+    with _pool_lock:
+        handle = _pool.get(key)
+        if handle is None:
+            if isinstance(bus, int):
+                handle = BusHandle(SMBus(bus), key)
+            else:
+                # User-supplied backends are closed by their owner, not here
+                handle = BusHandle(bus, key, owned=False)
+
+            _pool[key] = handle
+
+        handle.refs += 1
+
+    return handle
+
+
+
+def release(handle):
+    """Drop one reference to a BusHandle, closing its bus with the last one
+    """
+    with _pool_lock:
+        handle.refs -= 1
+        if handle.refs > 0:
+            return
+
+        if _pool.get(handle.key) is handle:
+            del _pool[handle.key]
+
+    if handle.executor is not None:
+        handle.executor.shutdown(wait=False)
+        handle.executor = None
+
+    if handle.owned:
+        with handle.lock:
+            handle.backend.close()
+
+
+
+#---------------------------------------------------
+if __name__ == '__main__':
+    pass
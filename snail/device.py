@@ -1,6 +1,11 @@
 
-import smbus2
-import numpy as np
+import threading
+import contextlib
+
+from . import bus as bus_backend
+
+# SMBus limit on the size of a single block transfer
+I2C_BLOCK_MAX = 32
 
 #--------------------------------------------------------------------
 # Helper functions
@@ -35,10 +40,8 @@ def number_of_bits(value):
     """Return number of bits required to represent the provided number
     """
     value = int(value)
-    if value == 0:
-        return 0
-    else:
-        return np.floor(np.log2(value) + 1)
+
+    return value.bit_length()
 
 
     
@@ -46,10 +49,8 @@ def number_of_bytes(value):
     """Return number of bytes required to represent the provided number
     """
     value = int(value)
-    if value == 0:
-        return 0
-    else:
-        return np.ceil(number_of_bits(value)/8)
+
+    return (number_of_bits(value) + 7)//8
 
 
 
@@ -97,6 +98,46 @@ def unpack_bits(data_binary, MSB, LSB):
     return data_bits
 
 
+def contiguous_runs(data, max_length=None):
+    """Group register values into runs of consecutive registers.
+    data : dict of register -> byte value
+    Return list of (start register, [byte values]), each run at most max_length long.
+    """
+    if max_length is None:
+        max_length = I2C_BLOCK_MAX
+
+    runs = []
+    for register in sorted(data):
+        if runs:
+            start, run = runs[-1]
+            if start + len(run) == register and len(run) < max_length:
+                run.append(data[register])
+                continue
+
+        runs.append((register, [data[register]]))
+
+    return runs
+
+
+
+def covering_spans(registers, max_length=None):
+    """Cover registers with as few spans as possible, each at most max_length long.
+    Return list of (start, stop) register ranges, stop is exclusive.
+    """
+    if max_length is None:
+        max_length = I2C_BLOCK_MAX
+
+    spans = []
+    for register in sorted(set(registers)):
+        if spans and register < spans[-1][0] + max_length:
+            spans[-1][1] = register + 1
+        else:
+            spans.append([register, register + 1])
+
+    return [tuple(span) for span in spans]
+
+
+
 def check_byte_value(val):
     if val < 0:
         raise ValueError('Byte value may not be negative: {}'.format(val))
@@ -109,38 +150,48 @@ def check_byte_value(val):
 #----------------------------------------------------------------------
 
 
-class Device():
-    """Manage data parameters with I2C/SMBus device
+class Layout():
+    """Compiled register layout of a single device parameter.
+    Each field is a tuple (register, reg_shift, reg_mask, dat_shift) such that
+    the field's bits are ((byte & reg_mask) >> reg_shift) << dat_shift.
     """
-    def __init__(self, address, parameters, bus, debug=False):
-        """Instantiate device manager
-        """
-        self._debug = debug
-        self._address = address
+    __slots__ = ('name', 'handle', 'fields', 'registers')
 
-        check_bits(parameters)
-        self._ingest_parameters(parameters)
-        check_bits(self._parameters)
+    def __init__(self, name, handle, values):
+        self.name = name
+        self.handle = handle
+        self.fields = tuple((R['register'],
+                             R['reg_LSB'],
+                             mask(R['reg_MSB'], R['reg_LSB']),
+                             R['dat_LSB']) for R in values)
+        self.registers = tuple(sorted(set(R['register'] for R in values)))
+
+    def __repr__(self):
+        return 'Layout({!r}, handle={})'.format(self.name, self.handle)
 
-        if self._debug:
-            self._smbus = None
 
-            N = 500  # max. number of registers
-            self._cache = np.zeros(N, dtype=np.uint8)
-        else:
-            self._smbus = smbus2.SMBus(bus)
-            self._cache = None
 
-    def _ingest_parameters(self, parameters):
+class CompiledParameters():
+    """Parameter map validated and compiled once, for sharing between Device instances
+    built from the same fixed map.  Later changes to the source map are not seen.
+    """
+    __slots__ = ('parameters', 'layouts', 'lookup')
+
+    def __init__(self, parameters):
+        check_bits(parameters)
+        self._ingest(parameters)
+        self._compile()
+
+    def _ingest(self, parameters):
         """Process provided device parameters, store internally.
         Also check for missing data MSB/LSB values (that's OK) and compute default values
         assuming LSB = 0 and MSB is derived from required register LSB/MSB values.
         """
-        self._parameters = {}
+        self.parameters = {}
         
         # Loop over data parameters
         for name, values in parameters.items():
-            self._parameters[name] = []
+            self.parameters[name] = []
             # Loop over device registers associated with this parameter
             for R in values:
                 register = {}
@@ -151,71 +202,541 @@ class Device():
                     register['dat_MSB'] = R['reg_MSB'] - R['reg_LSB']
                     register['dat_LSB'] = 0
                     
-                self._parameters[name].append(register)
+                self.parameters[name].append(register)
+
+    def _compile(self):
+        """Precompute register layouts for fast parameter access.
+        Layouts are reachable by parameter name and by integer handle.
+        """
+        self.layouts = []
+        self.lookup = {}
+
+        for name in sorted(self.parameters):
+            layout = Layout(name, len(self.layouts), self.parameters[name])
+
+            self.layouts.append(layout)
+            self.lookup[name] = layout
+            self.lookup[layout.handle] = layout
+
+
+
+class Device():
+    """Manage data parameters with I2C/SMBus device
+    """
+    def __init__(self, address, parameters, bus, debug=False, shadow=False, volatile=()):
+        """Instantiate device manager
+
+        parameters : dict parameter map, validated and compiled for this instance,
+                     or CompiledParameters shared between instances
+
+        bus : bus number of a real SMBus, or a bus backend object (see snail.bus)
+        debug : use an in-memory register file instead of the bus
+        shadow : keep an in-memory image of the device registers and use it for the
+                 prior byte of read-modify-write cycles instead of reading the bus.
+        volatile : registers that are never served from the shadow image, e.g. status
+                   flags or self-clearing bits.
+        """
+        self._debug = debug
+        self._address = address
+
+        if not isinstance(parameters, CompiledParameters):
+            parameters = CompiledParameters(parameters)
+
+        self._parameters = parameters.parameters
+        self._layouts = parameters.layouts
+        self._lookup = parameters.lookup
+
+        # Bus connection and lock shared with every other Device on the same bus
+        self._handle = bus_backend.acquire(bus, debug=debug)
+        self._bus = self._handle.backend
+        self._lock = self._handle.lock
+
+        self._volatile = set(volatile)
+
+        self._shadow = None
+        self._shadow_valid = None
+        if shadow:
+            self.enable_shadow()
+
+        # Pending register updates while inside a batch() context, per thread so
+        # writes from other threads are not swallowed by this thread's batch
+        self._batch = threading.local()
+
+    def layout(self, name):
+        """Return compiled register Layout for parameter name or handle
+        """
+        return self._lookup[name]
+
+    def handle(self, name):
+        """Return integer handle for named parameter.
+        Handles may be used in place of names for faster parameter access.
+        """
+        return self._lookup[name].handle
 
     def write_byte(self, register, data_byte):
         """Write a byte to designated register
         """
         check_byte_value(data_byte)
-            
-        if self._debug:
-            self._cache[register] = data_byte
-        else:
-            self._smbus.write_byte_data(self._address, register, data_byte)
+
+        with self._lock:
+            self._bus.write_byte_data(self._address, register, data_byte)
+
+            if self._shadow is not None:
+                self._shadow[register] = data_byte
+                self._shadow_valid[register] = 1
+
+            self._written(register, 1)
 
     def read_byte(self, register):
         """Read a byte from designated register
         """
-        if self._debug:
-            return self._cache[register]
-        else:
-            return self._smbus.read_byte_data(self._address, register)
+        with self._lock:
+            data_byte = self._bus.read_byte_data(self._address, register)
+
+            if self._shadow is not None:
+                self._shadow[register] = data_byte
+                self._shadow_valid[register] = 1
+
+        return data_byte
+
+    def read_block(self, register, length):
+        """Read a sequence of bytes from consecutive registers starting at designated register.
+        Long sequences are split into chunks of at most I2C_BLOCK_MAX bytes.
+        """
+        data = []
+        with self._lock:
+            for k in range(0, length, I2C_BLOCK_MAX):
+                start = register + k
+                size = min(I2C_BLOCK_MAX, length - k)
+
+                if size == 1:
+                    data.append(self.read_byte(start))
+                    continue
+
+                chunk = self._bus.read_i2c_block_data(self._address, start, size)
+
+                data.extend(chunk)
+
+            if self._shadow is not None:
+                self._shadow[register:register+length] = bytes(data)
+                self._shadow_valid[register:register+length] = b'\x01'*length
+
+        return data
+
+    def read_registers(self, registers):
+        """Read several registers with as few block reads as possible.
+        Nearby registers are fetched in the same block, even when that means also
+        reading a few unneeded registers in between.
+        Return dict of register -> byte value.
+        """
+        data = {}
+        with self._lock:
+            for start, stop in covering_spans(registers):
+                for k, val in enumerate(self.read_block(start, stop - start)):
+                    data[start + k] = val
+
+        return data
+
+    def write_block(self, register, data):
+        """Write a sequence of bytes to consecutive registers starting at designated register.
+        Long sequences are split into chunks of at most I2C_BLOCK_MAX bytes.
+        """
+        data = list(data)
+        for val in data:
+            check_byte_value(val)
+
+        with self._lock:
+            for k in range(0, len(data), I2C_BLOCK_MAX):
+                chunk = data[k:k+I2C_BLOCK_MAX]
+                start = register + k
+
+                if len(chunk) == 1:
+                    self.write_byte(start, chunk[0])
+                    continue
+
+                self._bus.write_i2c_block_data(self._address, start, chunk)
+
+                if self._shadow is not None:
+                    self._shadow[start:start+len(chunk)] = bytes(chunk)
+                    self._shadow_valid[start:start+len(chunk)] = b'\x01'*len(chunk)
+
+                self._written(start, len(chunk))
+
+    def _written(self, register, length):
+        """Called after length registers starting at register were written.
+        Subclasses caching register content override this.
+        """
+        pass
+
+    def write_registers(self, data):
+        """Write register values, grouping contiguous registers into burst writes.
+        data : dict of register -> byte value
+        """
+        with self._lock:
+            for register, run in contiguous_runs(data):
+                self.write_block(register, run)
+
+    #----------------------------------
+    # Full register map
+    def snapshot(self, stop=None):
+        """Read the device register space, from register 0 up to stop (exclusive),
+        using block reads.  Default stop is one past the highest register referenced
+        by the parameters.
+        Return bytearray register image.
+        """
+        if stop is None:
+            stop = self.registers[-1] + 1
+
+        return bytearray(self.read_block(0, stop))
+
+    def restore(self, image, current=None, max_gap=2):
+        """Bring device registers to match supplied register image, writing only
+        the registers that differ as burst writes.  Volatile registers are skipped.
+
+        image : register image as returned by snapshot()
+        current : present register image, read from the device if not supplied
+        max_gap : runs of differing registers separated by at most this many
+                  unchanged registers are merged into a single burst
+
+        Return dict of register -> byte value that were written.
+        """
+        image = bytearray(image)
+
+        with self._lock:
+            if current is None:
+                current = self.snapshot(len(image))
+
+            changed = [register for register, val in enumerate(image)
+                       if val != current[register] and register not in self._volatile]
+
+            data = {}
+            last = None
+            for register in changed:
+                if last is not None:
+                    gap = range(last + 1, register)
+                    if len(gap) <= max_gap and not self._volatile.intersection(gap):
+                        for k in gap:
+                            data[k] = image[k]
+
+                data[register] = image[register]
+                last = register
+
+            self.write_registers(data)
+
+        return data
+
+    #----------------------------------
+    # Shadow register image
+    @property
+    def registers(self):
+        """Sorted list of device registers referenced by the parameters
+        """
+        registers = set()
+        for layout in self._layouts:
+            registers.update(layout.registers)
+
+        return sorted(registers)
+
+    @property
+    def shadow_enabled(self):
+        return self._shadow is not None
+
+    def enable_shadow(self):
+        """Start keeping a shadow image of the device registers.
+        Registers are seeded from the device the first time they are needed.
+        """
+        if self._shadow is None:
+            N = 256  # size of the 8-bit register address space
+            self._shadow = bytearray(N)
+            self._shadow_valid = bytearray(N)
+
+    def disable_shadow(self):
+        """Stop using the shadow register image
+        """
+        self._shadow = None
+        self._shadow_valid = None
+
+    def invalidate(self, registers=None):
+        """Mark shadowed register(s) as stale, forcing a fresh read on next use.
+        Invalidate all registers if none are specified.
+        """
+        if self._shadow is None:
+            return
+
+        if registers is None:
+            registers = range(len(self._shadow_valid))
+        elif isinstance(registers, int):
+            registers = [registers]
+
+        for register in registers:
+            self._shadow_valid[register] = 0
+
+    def resync(self):
+        """Refresh the shadow image from the device registers
+        """
+        self.enable_shadow()
+        self.invalidate()
+
+        self.read_registers([r for r in self.registers if r not in self._volatile])
+
+    def read_prior_byte(self, register):
+        """Return current content of register prior to a read-modify-write cycle.
+        Served from the shadow image when available.
+        """
+        if (self._shadow is not None and self._shadow_valid[register] and
+                register not in self._volatile):
+            return self._shadow[register]
+
+        return self.read_byte(register)
+
+    def read_prior_bytes(self, registers):
+        """Return current content of several registers prior to a read-modify-write cycle.
+        Registers not available from the shadow image are fetched with block reads.
+        Return dict of register -> byte value.
+        """
+        prior = {}
+        missing = []
+        for register in registers:
+            if (self._shadow is not None and self._shadow_valid[register] and
+                    register not in self._volatile):
+                prior[register] = self._shadow[register]
+            else:
+                missing.append(register)
+
+        if missing:
+            data = self.read_registers(missing)
+            for register in missing:
+                prior[register] = data[register]
+
+        return prior
 
     def get_parameter(self, name):
         """Extract parameter value from device register(s)
+        name : parameter name or integer handle
         """
         value = 0
-        for register in self._parameters[name]:
-            data_reg_byte = self.read_byte(register['register'])
-            
-            data_intermed = unpack_bits(data_reg_byte, register['reg_MSB'], register['reg_LSB'])
-
-            data_value = pack_bits(data_intermed, register['dat_MSB'], register['dat_LSB'])
-            value += data_value
+        # Held across all registers so a concurrent write cannot tear the value
+        with self._lock:
+            for register, reg_shift, reg_mask, dat_shift in self._lookup[name].fields:
+                data_reg_byte = self.read_byte(register)
+                value |= ((data_reg_byte & reg_mask) >> reg_shift) << dat_shift
 
         return value
+
+    def get_parameters(self, names):
+        """Extract several parameter values, fetching the union of their registers
+        with as few block reads as possible.
+        Return dict of parameter name -> value.
+        """
+        registers = set()
+        for name in names:
+            registers.update(self._lookup[name].registers)
+
+        data = self.read_registers(registers)
+
+        return self.decode_parameters(names, data)
+
+    def decode_parameters(self, names, image):
+        """Extract parameter values from register content without touching the device.
+        image : register image indexed by register number, e.g. from snapshot(),
+                or dict of register -> byte value
+        Return dict of parameter name -> value.
+        """
+        values = {}
+        for name in names:
+            value = 0
+            for register, reg_shift, reg_mask, dat_shift in self._lookup[name].fields:
+                value |= ((image[register] & reg_mask) >> reg_shift) << dat_shift
+
+            values[name] = value
+
+        return values
         
-    def set_parameter(self, name, value):
-        """Bit-pack data value and write byte(s) to device register(s)
+    def _pack_parameter(self, name, value, updates):
+        """Bit-pack data value into per-register (mask, bits) updates.
+        Parameters sharing a register are merged into the same entry.
         """
         if value < 0:
             raise ValueError('Only unsigned integers allowed: {}'.format(value))
 
         value = int(value)
         
-        for register in self._parameters[name]:
-            if 'dat_LSB' not in register:
-                register['dat_MSB'] = 7
-                register['dat_LSB'] = 0
-                
-            # Unpack data bits
-            data_intermed = unpack_bits(value, register['dat_MSB'], register['dat_LSB'])
-                
-            # Pack to register byte, zero padded outside data range
-            data_reg_byte = pack_bits(data_intermed, register['reg_MSB'], register['reg_LSB'])
-
-            if 7 > register['reg_MSB'] or register['reg_LSB'] > 0:
-                # Read device's existing register, mask out bits for current parameter
-                # TODO: A cached or shadowed register set could potentially speed up overall write performance
-                data_prior_byte = self.read_byte(register['register'])
-                data_prior_byte &= ~mask(register['reg_MSB'], register['reg_LSB'])  # notice the ~
-
-                # Update register value with pre-existing values outside of current parameter bit range
-                data_reg_byte += data_prior_byte
-            
-            # Write byte to register address
-            self.write_byte(register['register'], data_reg_byte)
-            
+        for register, reg_shift, reg_mask, dat_shift in self._lookup[name].fields:
+            # Data bits shifted into place, zero padded outside of register bit range
+            data_reg_byte = ((value >> dat_shift) << reg_shift) & reg_mask
+
+            mask_prior, data_prior = updates.get(register, (0, 0))
+            updates[register] = (mask_prior | reg_mask,
+                                 (data_prior & ~reg_mask) | data_reg_byte)
+
+    def _write_updates(self, updates):
+        """Apply per-register (mask, bits) updates.  Registers only partially covered
+        are merged with their prior content, then everything goes out as burst writes.
+        """
+        # Bus lock held from reading the prior bytes until the merged bytes are written,
+        # so read-modify-write cycles from other threads cannot interleave
+        with self._lock:
+            partial = [register for register, (reg_mask, _) in updates.items() if reg_mask != 0xFF]
+            prior = self.read_prior_bytes(partial)
+
+            data = {}
+            for register, (reg_mask, data_reg_byte) in updates.items():
+                if reg_mask != 0xFF:
+                    # Device's existing register, mask out bits for current parameter(s)
+                    data_prior_byte = prior[register]
+                    data_prior_byte &= ~reg_mask  # notice the ~
+
+                    # Update register value with pre-existing values outside of parameter bit range
+                    data_reg_byte |= data_prior_byte
+
+                data[register] = data_reg_byte
+
+            self.write_registers(data)
+
+    def pack_parameters(self, values):
+        """Bit-pack several data values into a register image without writing it.
+        values : dict of parameter name -> value
+        Return dict of register -> (mask, bits), mask covering the bits set by the values.
+        """
+        image = {}
+        for name, value in values.items():
+            self._pack_parameter(name, value, image)
+
+        return image
+
+    def write_image(self, image):
+        """Write register image from pack_parameters() to the device.
+        Fully covered registers are written directly, partially covered ones are merged
+        with their prior content.  Deferred when inside a batch.
+        """
+        if self._pending is not None:
+            for register, (reg_mask, data_reg_byte) in image.items():
+                mask_prior, data_prior = self._pending.get(register, (0, 0))
+                self._pending[register] = (mask_prior | reg_mask,
+                                           (data_prior & ~reg_mask) | data_reg_byte)
+            return
+
+        self._write_updates(image)
+
+    def set_parameter(self, name, value):
+        """Bit-pack data value and write byte(s) to device register(s).
+        A single parameter goes straight to the bus: one pass over its layout under
+        one lock, prior bytes from the shadow image or single-byte reads, and a
+        single-byte write unless the parameter spans several registers.
+        """
+        layout = self._lookup[name]
+        if self._pending is not None or len(layout.fields) != len(layout.registers):
+            # Batched, or several fields in one register: merge through the generic path
+            self.set_parameters({name: value})
+            return
+
+        if value < 0:
+            raise ValueError('Only unsigned integers allowed: {}'.format(value))
+
+        value = int(value)
+
+        with self._lock:
+            if len(layout.fields) == 1:
+                register, reg_shift, reg_mask, dat_shift = layout.fields[0]
+                data_reg_byte = ((value >> dat_shift) << reg_shift) & reg_mask
+                if reg_mask != 0xFF:
+                    data_reg_byte |= self.read_prior_byte(register) & ~reg_mask
+
+                self.write_byte(register, data_reg_byte)
+                return
+
+            data = {}
+            for register, reg_shift, reg_mask, dat_shift in layout.fields:
+                data_reg_byte = ((value >> dat_shift) << reg_shift) & reg_mask
+                if reg_mask != 0xFF:
+                    data_reg_byte |= self.read_prior_byte(register) & ~reg_mask
+
+                data[register] = data_reg_byte
+
+            registers = layout.registers
+            start = registers[0]
+            length = len(registers)
+            if registers[-1] - start + 1 != length or length > I2C_BLOCK_MAX:
+                self.write_registers(data)
+                return
+
+            # One contiguous run of bytes already known to be valid, a single burst
+            chunk = [data[register] for register in registers]
+            self._bus.write_i2c_block_data(self._address, start, chunk)
+
+            if self._shadow is not None:
+                self._shadow[start:start+length] = bytes(chunk)
+                self._shadow_valid[start:start+length] = b'\x01'*length
+
+            self._written(start, length)
+
+    def set_parameters(self, values):
+        """Bit-pack several data values and write them with as few transactions as possible.
+        values : dict of parameter name -> value
+        """
+        self.write_image(self.pack_parameters(values))
+
+    @property
+    def _pending(self):
+        return getattr(self._batch, 'pending', None)
+
+    @_pending.setter
+    def _pending(self, pending):
+        self._batch.pending = pending
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager accumulating parameter writes in memory.
+        On exit, values targeting the same register are merged into one byte and
+        flushed with burst writes.  Registers fully covered by the batched parameters
+        are written without reading them back first.  Nothing is written if the
+        block raises an exception.
+
+        Note that parameter reads inside the batch see the device, not pending values.
+        The batch only collects writes made by the thread that opened it.
+        """
+        if self._pending is not None:
+            # Nested batch, outermost context does the flush
+            yield self
+            return
+
+        self._pending = {}
+        try:
+            yield self
+            updates = self._pending
+        finally:
+            self._pending = None
+
+        self._write_updates(updates)
+
+    #----------------------------------
+    # Shared bus
+    @property
+    def lock(self):
+        """Bus lock shared by all devices on the bus.  Hold it to make a sequence of
+        operations atomic with respect to other threads, e.g.
+
+            with device.lock:
+                value = device['X']
+                device['X'] = value + 1
+        """
+        return self._lock
+
+    def close(self):
+        """Release this device's reference to the shared bus.
+        The bus is closed once no device uses it.
+        """
+        if self._handle is not None:
+            bus_backend.release(self._handle)
+            self._handle = None
+            self._bus = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def __setitem__(self, name, value):
         self.set_parameter(name, value)
         
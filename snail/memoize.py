@@ -1,5 +1,9 @@
 
-import pickle
+import os
+import time
+import functools
+import threading
+import collections
 
 
 def flexi_hash(data):
@@ -8,29 +12,487 @@ def flexi_hash(data):
     try:
         key = hash(data)
     except TypeError:
+        import pickle
         key = hash(pickle.dumps(data))
         
     return key
 
 
 
+def sorted_items(items):
+    """Sort items in a repeatable order, even for keys of mixed types
+    """
+    try:
+        return tuple(sorted(items))
+    except TypeError:
+        return tuple(sorted(items, key=repr))
+
+
+
+def freeze(data):
+    """Hashable structural equivalent of data.
+    Lists, tuples, dicts, and sets are converted element by element.  Arrays and
+    other buffers are reduced to their format, shape, and a digest of their bytes
+    via the buffer protocol.  Anything else falls back to a digest of its pickle.
+    """
+    if isinstance(data, (list, tuple)):
+        return (type(data).__name__,) + tuple(freeze(item) for item in data)
+
+    if isinstance(data, dict):
+        return ('dict',) + sorted_items((key, freeze(value)) for key, value in data.items())
+
+    if isinstance(data, (set, frozenset)):
+        return ('set',) + sorted_items(freeze(item) for item in data)
+
+    try:
+        hash(data)
+        return data
+    except TypeError:
+        pass
+
+    try:
+        view = memoryview(data)
+    except TypeError:
+        view = None
+
+    # Imported here, not at module level, to keep package import fast
+    import pickle
+    import hashlib
+
+    # Buffers of object pointers say nothing about the values
+    if view is not None and 'O' not in view.format:
+        digest = hashlib.blake2b(view if view.c_contiguous else view.tobytes()).digest()
+        return ('buffer', type(data).__name__, view.format, view.shape, digest)
+
+    return ('pickle', type(data).__name__, hashlib.blake2b(pickle.dumps(data)).digest())
+
+
+
+def make_key(args, kwargs):
+    """Cache key for a function call: tuple of args plus sorted kwargs.
+    Hashable arguments are used as they are, anything else is frozen structurally.
+    """
+    if kwargs:
+        key = (args, sorted_items(kwargs.items()))
+    else:
+        key = (args,)
+
+    try:
+        hash(key)
+    except TypeError:
+        # Three elements, never equal to a plain key
+        key = ('frozen', freeze(args), sorted_items((name, freeze(value)) for name, value in kwargs.items()))
+
+    return key
+
+
+
+def persistent_key(args, kwargs):
+    """Digest of the structural key of a function call, stable across processes.
+    Unlike hash(), which is randomized per process for strings and bytes.
+    """
+    import pickle
+    import hashlib
+
+    key = (freeze(args), sorted_items((name, freeze(value)) for name, value in kwargs.items()))
+
+    return hashlib.blake2b(pickle.dumps(key, protocol=PICKLE_PROTOCOL)).digest()
+
+
+
+class SQLiteStore():
+    """Persistent cache of pickled results in a sqlite database file.
+    One file may be shared by any number of threads and processes on a host.
+    Entries are namespaced by function name and version; entries made under any
+    other version are ignored, and may be deleted with prune().
+    """
+    def __init__(self, path, timeout=30.):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """Connection for the calling thread and process
+        """
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS memoize ('
+                               'name TEXT, version TEXT, key BLOB, value BLOB, expires REAL, '
+                               'PRIMARY KEY (name, version, key))')
+            connection.commit()
+
+            self._local.connection = connection
+            self._local.pid = pid
+
+        return self._local.connection
+
+    def get(self, name, version, key):
+        """Return (True, value) for a stored result, else (False, None)
+        """
+        row = self._connection().execute('SELECT value, expires FROM memoize '
+                                         'WHERE name=? AND version=? AND key=?',
+                                         (name, version, key)).fetchone()
+        if row is None:
+            return False, None
+
+        value, expires = row
+        if expires is not None and time.time() >= expires:
+            return False, None
+
+        import pickle
+        try:
+            return True, pickle.loads(value)
+        except Exception:
+            # Written by incompatible code, treat as missing
+            return False, None
+
+    def set(self, name, version, key, value, expires=None):
+        """Store a result, expires is a time.time() value or None
+        """
+        import pickle
+        data = pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+
+        connection = self._connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO memoize VALUES (?, ?, ?, ?, ?)',
+                               (name, version, key, data, expires))
+
+    def clear(self, name, version):
+        """Delete all results stored for name and version
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM memoize WHERE name=? AND version=?', (name, version))
+
+    def prune(self, name, version):
+        """Delete results stored for name under any version other than version.
+        Return number of entries deleted.
+        """
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute('DELETE FROM memoize WHERE name=? AND version!=?', (name, version))
+
+        return cursor.rowcount
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+
+        self._local = threading.local()
+
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+# Default bound on the number of cached results
+MAXSIZE = 1024
+
+# Fixed so persistent keys and values read the same from every interpreter
+PICKLE_PROTOCOL = 4
+
+# inspect.CO_COROUTINE, without importing inspect (or asyncio) for sync users
+CO_COROUTINE = 0x80
+
+
+
+class Flight():
+    """Result of a computation in progress, waited on by other threads
+    """
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_exception(self, error):
+        self._error = error
+        self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+
+        return self._result
+
+
+
 class Memoize():
-    """Function decorator
+    """Function decorator caching results by call arguments.
+    maxsize : bound on the number of cached results, least recently used evicted
+              first.  None for an unbounded cache.
+    ttl : seconds a result stays valid, None to keep results until evicted
+    timer : clock function for ttl, default time.monotonic
+    store : optional persistent store, e.g. SQLiteStore, backing the in-memory cache
+    version : string naming the algorithm version, results stored under any other
+              version are ignored.  Change it whenever the function's results change.
+    single_flight : concurrent first calls with the same arguments run the function
+                    once, the other callers wait for its result.  Otherwise each
+                    caller computes the result itself.
+
+    Safe to share across threads, the function itself runs outside the lock.
+    Coroutine functions are supported, calls return awaitables; with single_flight
+    the waiting is done by tasks on the same event loop.
     """
-    def __init__(self, func):
-        self._cache = {}
+    def __init__(self, func, maxsize=MAXSIZE, ttl=None, timer=time.monotonic,
+                 store=None, version='', single_flight=False):
+        self._cache = collections.OrderedDict()
         self._func = func
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._timer = timer
+        self._lock = threading.RLock()
+        self._single_flight = single_flight
+        self._is_async = bool(getattr(getattr(func, '__code__', None), 'co_flags', 0) & CO_COROUTINE)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        functools.update_wrapper(self, func)
+
+        self.name = '{}.{}'.format(func.__module__, func.__qualname__)
+        self.set_store(store, version)
+
+    def set_store(self, store, version=None):
+        """Attach persistent store (None to detach), optionally changing the version
+        """
+        with self._lock:
+            self._store = store
+            if version is not None:
+                self.version = str(version)
+            self.store_hits = 0
+
+    def _lookup(self, key):
+        """Return (True, result) for a fresh cached result, else (False, None).
+        Call with the lock held.
+        """
+        try:
+            expires, result = self._cache[key]
+        except KeyError:
+            return False, None
+
+        if expires is None or self._timer() < expires:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return True, result
+
+        # Stale
+        del self._cache[key]
+        self.evictions += 1
+
+        return False, None
+
+    def _insert(self, key, result):
+        """Cache result, evicting least recently used results beyond maxsize
+        """
+        with self._lock:
+            if self._ttl is None:
+                expires = None
+            else:
+                expires = self._timer() + self._ttl
+
+            self._cache[key] = (expires, result)
+            self._cache.move_to_end(key)
+            while self._maxsize is not None and len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def _load(self, args, kwargs):
+        """Return (True, result) from the persistent store, else (False, stored_key)
+        """
+        store = self._store
+        if store is None:
+            return False, None
+
+        stored_key = persistent_key(args, kwargs)
+        found, result = store.get(self.name, self.version, stored_key)
+        if not found:
+            return False, stored_key
+
+        with self._lock:
+            self.store_hits += 1
+
+        return True, result
+
+    def _compute(self, key, args, kwargs):
+        found, result = self._load(args, kwargs)
+        if not found:
+            stored_key = result
+            result = self._func(*args, **kwargs)
+            if stored_key is not None:
+                self._persist(self._store, stored_key, result)
+
+        self._insert(key, result)
+
+        return result
 
     def __call__(self, *args, **kwargs):
-        key = flexi_hash(args) + flexi_hash(kwargs)
+        if self._is_async:
+            return self._call_async(args, kwargs)
 
-        if key not in self._cache:
-            self._cache[key] = self._func(*args, **kwargs)
+        key = make_key(args, kwargs)
+
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                return result
+
+            flight = self._inflight.get(key) if self._single_flight else None
+            if flight is not None and flight.owner != threading.get_ident():
+                # Another thread is computing this result
+                self.coalesced += 1
+                waiting = True
+            else:
+                self.misses += 1
+                waiting = False
+                if self._single_flight and flight is None:
+                    flight = Flight()
+                    self._inflight[key] = flight
+                else:
+                    # Not single flight, or a recursive call from the computing thread
+                    flight = None
+
+        if waiting:
+            return flight.result()
+
+        try:
+            result = self._compute(key, args, kwargs)
+        except BaseException as error:
+            if flight is not None:
+                with self._lock:
+                    del self._inflight[key]
+                flight.set_exception(error)
+            raise
+
+        if flight is not None:
+            with self._lock:
+                del self._inflight[key]
+            flight.set_result(result)
+
+        return result
+
+    async def _compute_async(self, key, args, kwargs):
+        found, result = self._load(args, kwargs)
+        if not found:
+            stored_key = result
+            result = await self._func(*args, **kwargs)
+            if stored_key is not None:
+                self._persist(self._store, stored_key, result)
+
+        self._insert(key, result)
+
+        return result
+
+    async def _call_async(self, args, kwargs):
+        import asyncio
+
+        key = make_key(args, kwargs)
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            found, result = self._lookup(key)
+            if found:
+                return result
+
+            task = self._inflight.get(key) if self._single_flight else None
+            if task is not None and task.get_loop() is loop:
+                # Another task is computing this result
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                if not self._single_flight:
+                    task = None
+                else:
+                    # Computation runs in its own task, cancelling one caller
+                    # leaves it running for the others
+                    task = loop.create_task(self._compute_async(key, args, kwargs))
+                    self._inflight[key] = task
+                    task.add_done_callback(lambda done: self._land(key, done))
+
+        if task is None:
+            return await self._compute_async(key, args, kwargs)
+
+        return await asyncio.shield(task)
+
+    def _land(self, key, task):
+        """Forget finished single flight task
+        """
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _persist(self, store, key, result):
+        """Save result to the persistent store, if it can be pickled
+        """
+        import pickle
+        expires = None if self._ttl is None else time.time() + self._ttl
+        try:
+            store.set(self.name, self.version, key, result, expires)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            pass
+
+    def expire(self):
+        """Drop all results older than ttl
+        """
+        if self._ttl is None:
+            return
+
+        with self._lock:
+            now = self._timer()
+            stale = [key for key, (expires, _) in self._cache.items() if now >= expires]
+            for key in stale:
+                del self._cache[key]
+
+            self.evictions += len(stale)
+
+    def cache_info(self):
+        """Return CacheInfo(hits, misses, evictions, maxsize, currsize)
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self._maxsize, len(self._cache))
+
+    def cache_clear(self):
+        """Discard all cached results, including those in the persistent store for
+        this version, and reset the counters
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.coalesced = 0
+            self.store_hits = 0
+
+            if self._store is not None:
+                self._store.clear(self.name, self.version)
 
-        return self._cache[key]
-        
     def _clear_cache(self):
-        self._cache = {}
+        self.cache_clear()
+        
+
+
+def memoize(maxsize=MAXSIZE, ttl=None, store=None, version='', single_flight=False):
+    """Memoize decorator with arguments, e.g.
+
+        @memoize(maxsize=256, ttl=60, single_flight=True)
+        def f(x):
+            ...
+    """
+    def decorator(func):
+        return Memoize(func, maxsize=maxsize, ttl=ttl, store=store, version=version,
+                       single_flight=single_flight)
+
+    return decorator
         
         
         
@@ -52,5 +514,3 @@ if __name__ == '__main__':
     print(hello(1, 2, [3, 4, 5]))
     print(hello(1, 2, [3, 4, 7]))
     print(hello(1, 2, [3, 4, 7]))
-    
-          
\ No newline at end of file
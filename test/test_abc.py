@@ -0,0 +1,141 @@
+
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import math
+import random
+import pathlib
+from fractions import Fraction
+
+import numpy as np
+
+import context
+
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import constants
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestComputeABC(unittest.TestCase):
+    def setUp(self):
+        random.seed(1234)
+
+    def tearDown(self):
+        pass
+
+    def test_integer(self):
+        self.assertTrue(clock.compute_abc(32) == (32, 0, 1))
+        self.assertTrue(clock.compute_abc(Fraction(800000000, 25000000)) == (32, 0, 1))
+        self.assertTrue(clock.compute_abc(32.0) == (32, 0, 1))
+
+    def test_exact(self):
+        self.assertTrue(clock.compute_abc(Fraction(91, 3)) == (30, 1, 3))
+        self.assertTrue(clock.compute_abc(Fraction(14070000, 25000000)*64) == (36, 12, 625))
+
+        value = 30 + Fraction(12346, constants.C_MAX)
+        self.assertTrue(clock.compute_abc(value) == (30, 12346, constants.C_MAX))
+
+    def test_bounded(self):
+        for k in range(200):
+            value = Fraction(random.randint(15*10**9, 90*10**9), 10**9 + random.randint(0, 999))
+            a, b, c = clock.compute_abc(value)
+            self.assertTrue(0 <= b < c <= constants.C_MAX, (value, a, b, c))
+
+            # No better approximation with a smaller or equal denominator nearby
+            err = abs(value - a - Fraction(b, c))
+            for d in [c - 1, c + 1]:
+                if 0 < d <= constants.C_MAX:
+                    n = round((value - a)*d)
+                    self.assertGreaterEqual(abs(value - a - Fraction(n, d)), err if d < c else 0)
+
+    def test_round_up(self):
+        value = 30 + Fraction(constants.C_MAX*10 - 1, constants.C_MAX*10)
+        self.assertTrue(clock.compute_abc(value) == (31, 0, 1))
+
+    def test_deterministic(self):
+        self.assertTrue(clock.compute_abc(800e6/14.07e6) == clock.compute_abc(800e6/14.07e6))
+
+    def test_cache(self):
+        clock.clear_caches()
+        self.assertTrue(clock.cache_info()['compute_abc'].currsize == 0)
+
+        C = clock.Clock(debug=True)
+        C.config_PLL(800e6, 'A')
+        C.config_MS(14.07e6, 0)
+        C.config_MS(14.07e6, 0)
+        C.config_PLL(800e6, 'A')
+
+        info = clock.cache_info()
+        self.assertTrue(info['compute_abc'].misses == 2 and info['compute_abc'].hits == 2)
+        self.assertTrue(info['encode_abc'].misses == 2 and info['encode_abc'].hits == 2)
+
+        clock.clear_caches()
+        self.assertTrue(clock.cache_info()['encode_abc'] == (0, 0, 0, clock.ABC_CACHE_SIZE, 0))
+
+
+
+class TestEncodeABC(unittest.TestCase):
+    def setUp(self):
+        random.seed(4321)
+
+    def tearDown(self):
+        pass
+
+    def test_integer(self):
+        self.assertTrue(clock.encode_abc(32, 0, 1) == (3584, 0, 1))
+
+    def test_against_definition(self):
+        for k in range(1000):
+            c = random.randint(1, constants.C_MAX)
+            b = random.randint(0, c - 1)
+            a = random.randint(8, 2048)
+
+            P1 = 128*a + math.floor(Fraction(128*b, c)) - 512
+            P2 = 128*b - c*math.floor(Fraction(128*b, c))
+            tst = clock.encode_abc(a, b, c)
+            self.assertTrue(tst == (P1, P2, c), (a, b, c, tst))
+            self.assertTrue(all(isinstance(P, int) for P in tst))
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1234)
+        self.values = np.concatenate([rng.uniform(15, 90, 2000),
+                                      rng.uniform(6, 1800, 2000),
+                                      np.arange(6, 100) + 0.5,
+                                      30 + np.arange(1, 100)/constants.C_MAX,
+                                      30 + 1/(constants.C_MAX + np.arange(1, 100)),
+                                      800e6/np.array([14.07e6, 3.6e6, 10.0001e6, 7.0001e6]),
+                                      [15, 32, 90]])
+
+    def tearDown(self):
+        pass
+
+    def test_compute_abc_batch(self):
+        a, b, c = clock.compute_abc_batch(self.values)
+        for k, value in enumerate(self.values):
+            val = clock.compute_abc(float(value))
+            tst = (a[k], b[k], c[k])
+            self.assertTrue(tst == val, (value, tst, val))
+
+    def test_encode_abc_batch(self):
+        a, b, c = clock.compute_abc_batch(self.values)
+        P1, P2, P3 = clock.encode_abc_batch(a, b, c)
+        for k in range(len(a)):
+            val = clock.encode_abc(a[k], b[k], c[k])
+            tst = (P1[k], P2[k], P3[k])
+            self.assertTrue(tst == val, (a[k], b[k], c[k], tst, val))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, clock.compute_abc_batch, [0.5])
+        self.assertRaises(ValueError, clock.compute_abc_batch, [np.nan])
+
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
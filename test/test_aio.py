@@ -0,0 +1,187 @@
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import time
+import asyncio
+import pathlib
+import threading
+
+import context
+
+from snail import aio
+from snail import bus
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import registers
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class SlowBus(bus.MemoryBus):
+    """In-memory bus counting transactions, each taking delay seconds
+    """
+    def __init__(self, delay=0.):
+        super().__init__()
+        self.delay = delay
+        self.reads = 0
+        self.writes = 0
+        self.threads = set()
+
+    def transaction(self):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+
+    def read_byte_data(self, address, register):
+        self.reads += 1
+        self.transaction()
+        return super().read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value):
+        self.writes += 1
+        self.transaction()
+        super().write_byte_data(address, register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        self.reads += 1
+        self.transaction()
+        return super().read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        self.writes += 1
+        self.transaction()
+        super().write_i2c_block_data(address, register, data)
+
+
+
+class TestAsyncDevice(unittest.TestCase):
+    def setUp(self):
+        self.bus = SlowBus()
+        self.C = aio.AsyncClock(bus=self.bus)
+
+    def tearDown(self):
+        self.C.close()
+
+    def test_get_set(self):
+        async def main():
+            await self.C.set_parameter('MS0_P1', 1234)
+            return await self.C.get_parameter('MS0_P1')
+
+        self.assertTrue(asyncio.run(main()) == 1234)
+        self.assertTrue(self.C.clock['MS0_P1'] == 1234)
+
+    def test_merged(self):
+        async def main():
+            await asyncio.gather(*[self.C.set_parameter('CLK{}_OEB'.format(k), 1) for k in range(8)])
+            return await self.C.get_parameters(['CLK{}_OEB'.format(k) for k in range(8)])
+
+        values = asyncio.run(main())
+        self.assertTrue(all(value == 1 for value in values.values()))
+
+        # All eight bits of register 3 in a single write
+        self.assertTrue(self.bus.writes == 1, self.bus.writes)
+        self.assertTrue(self.bus.register_file(registers.address)[3] == 0xFF)
+
+    def test_last_value_wins(self):
+        async def main():
+            await asyncio.gather(self.C.set_parameter('MS0_P1', 1),
+                                 self.C.set_parameter('MS0_P1', 2),
+                                 self.C.set_parameter('MS0_P1', 3))
+            return await self.C.get_parameter('MS0_P1')
+
+        self.assertTrue(asyncio.run(main()) == 3)
+
+    def test_error(self):
+        async def main():
+            return await asyncio.gather(self.C.set_parameter('CLK0_OEB', 1),
+                                        self.C.set_parameter('NOT_A_PARAMETER', 1),
+                                        self.C.set_parameter('MS0_P1', -1),
+                                        self.C.get_parameter('CLK1_OEB'),
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(results[0] is None)
+        self.assertTrue(isinstance(results[1], KeyError))
+        self.assertTrue(isinstance(results[2], ValueError))
+        self.assertTrue(results[3] == 0)
+        self.assertTrue(self.C.clock['CLK0_OEB'] == 1)
+
+    def test_bus_error(self):
+        # Failed bus write reaches the merged writers, not other operations
+        def fail(*args):
+            raise OSError('bus')
+
+        async def main():
+            self.bus.write_byte_data = fail
+            return await asyncio.gather(self.C.set_parameter('CLK0_OEB', 1),
+                                        self.C.set_parameter('CLK1_OEB', 1),
+                                        self.C.get_parameter('CLK1_OEB'),
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(isinstance(results[0], OSError) and isinstance(results[1], OSError))
+        self.assertTrue(results[2] == 0)
+
+    def test_loop_not_blocked(self):
+        self.bus.delay = 0.01
+        ticks = []
+
+        async def ticker():
+            for k in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.002)
+
+        async def main():
+            await asyncio.gather(ticker(), self.C.get_parameters(['MS0_P1', 'MS5_P1', 'CLK0_OEB']))
+
+        asyncio.run(main())
+        self.assertTrue(len(ticks) == 5)
+        self.assertTrue(threading.get_ident() not in self.bus.threads)
+
+    def test_shared_executor(self):
+        D = aio.AsyncDevice(0x61, registers.parameters, self.bus)
+        self.assertTrue(D._executor is self.C._executor)
+
+        D.close()
+        self.assertTrue(self.C.device._handle.executor is not None)
+
+    def test_close(self):
+        handle = self.C.device._handle
+        self.C.close()
+        self.assertTrue(handle.executor is None)
+
+    def test_clock(self):
+        sync = clock.Clock(debug=True)
+        sync.config_PLL(800e6)
+        sync.config_MS(14.07e6, 0)
+        sync.config_CLK(0)
+
+        async def main():
+            await self.C.config_PLL(800e6)
+            await self.C.config_MS(14.07e6, 0)
+            await self.C.config_CLK(0)
+            await self.C.enable_output(0)
+            return await self.C.status()
+
+        record = asyncio.run(main())
+        self.assertTrue(record == self.C.clock.read_status())
+        for k in range(3):
+            name = 'MS0_P{}'.format(k+1)
+            self.assertTrue(self.C.clock[name] == sync[name])
+
+    def test_plan(self):
+        async def main():
+            plan = await self.C.plan({0: 10e6, 1: 14.07e6})
+            await self.C.apply(plan)
+            return plan
+
+        plan = asyncio.run(main())
+        for name, value in plan.parameters().items():
+            self.assertTrue(self.C.clock[name] == value, name)
+
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import pathlib
+
+import numpy as np
+
+import context
+
+from snail import device
+from snail import arrays
+from snail.Si5351_Clock import registers
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestArrayBits(unittest.TestCase):
+    def setUp(self):
+        self.values = np.arange(0, 4096, 7)
+
+    def tearDown(self):
+        pass
+
+    def test_pack_bits(self):
+        for MSB, LSB in [(0, 0), (7, 0), (12, 6), (5, 2)]:
+            tst = arrays.pack_bits(self.values, MSB, LSB)
+            val = [device.pack_bits(int(v), MSB, LSB) for v in self.values]
+            self.assertTrue(np.all(tst == val), (MSB, LSB))
+
+    def test_unpack_bits(self):
+        for MSB, LSB in [(0, 0), (7, 0), (12, 6), (7, 5)]:
+            tst = arrays.unpack_bits(self.values, MSB, LSB)
+            val = [device.unpack_bits(int(v), MSB, LSB) for v in self.values]
+            self.assertTrue(np.all(tst == val), (MSB, LSB))
+
+    def test_negative(self):
+        self.assertRaises(ValueError, arrays.pack_bits, [1, -1], 7, 0)
+
+
+
+class TestArrayParameters(unittest.TestCase):
+    def setUp(self):
+        self.D = device.Device(registers.address, registers.parameters, None, debug=True)
+
+    def tearDown(self):
+        pass
+
+    def test_encode_matches_device(self):
+        P1 = np.arange(0, 2**18, 997)
+        regs, data, masks = arrays.encode(self.D, {'MS0_P1': P1})
+        self.assertTrue(regs == (44, 45, 46), regs)
+        self.assertTrue(list(masks) == [0b11, 255, 255])
+
+        for k in [0, 1, len(P1)//2, len(P1) - 1]:
+            self.D['MS0_P1'] = int(P1[k])
+            image = self.D.snapshot()
+            self.assertTrue(list(data[k]) == [image[r] for r in regs])
+
+    def test_encode_shared_register(self):
+        values = {'MS0_P2': [0xABCDE, 1], 'MS0_P3': [0x54321, 2]}
+        regs, data, masks = arrays.encode(self.D, values)
+        self.assertTrue(regs == (42, 43, 47, 48, 49), regs)
+        self.assertTrue(np.all(masks == 255))
+
+        tst = arrays.decode(self.D, 'MS0_P2', data, registers=regs)
+        self.assertTrue(list(tst) == values['MS0_P2'], tst)
+        tst = arrays.decode(self.D, 'MS0_P3', data, registers=regs)
+        self.assertTrue(list(tst) == values['MS0_P3'], tst)
+
+    def test_encode_scalar(self):
+        # Scalars broadcast against array columns, or encode one row on their own
+        regs, data, masks = arrays.encode(self.D, {'MS0_P2': [1, 2, 3], 'MS0_P3': 7})
+        self.assertTrue(data.shape == (3, len(regs)), data.shape)
+        tst = arrays.decode(self.D, 'MS0_P3', data, registers=regs)
+        self.assertTrue(list(tst) == [7, 7, 7], tst)
+
+        regs, data, masks = arrays.encode(self.D, {'MS0_P1': 0x12345})
+        self.assertTrue(data.shape == (1, 3), data.shape)
+        tst = arrays.decode(self.D, 'MS0_P1', data, registers=regs)
+        self.assertTrue(list(tst) == [0x12345], tst)
+
+    def test_encode_bad_shape(self):
+        self.assertRaises(ValueError, arrays.encode, self.D, {'MS0_P2': [1, 2], 'MS0_P3': [1, 2, 3]})
+        self.assertRaises(ValueError, arrays.encode, self.D, {'MS0_P1': [[1, 2], [3, 4]]})
+
+    def test_encode_many_columns(self):
+        # More columns than np.broadcast accepts in one call
+        values = dict((name, [0, 1]) for name in registers.parameters)
+        regs, data, masks = arrays.encode(self.D, values)
+        self.assertTrue(data.shape == (2, len(regs)), data.shape)
+
+    def test_decode_snapshots(self):
+        images = []
+        values = [0, 1, 0x3FFFF, 0x12345]
+        for v in values:
+            self.D['MSNB_P1'] = v
+            images.append(self.D.snapshot())
+
+        tst = arrays.decode(self.D, 'MSNB_P1', np.array(images))
+        self.assertTrue(list(tst) == values, tst)
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
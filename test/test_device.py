@@ -30,13 +30,20 @@ self.assertRaises(Exception, some_func, arg, arg_nother)
 """
 
 import unittest
+from unittest import mock
 import os
+import sys
+import time
 import pathlib
+import threading
 
 import context
 
 from snail import device
+from snail import bus
 from snail.Si5351_Clock import registers
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import constants
 
 _path_module = pathlib.Path(__file__).parent.absolute()
 
@@ -145,6 +152,692 @@ class TestSetGetItem(unittest.TestCase):
 
 
 
+class TestHandle(unittest.TestCase):
+    def setUp(self):
+        A = None
+        P = registers.parameters
+        B = None
+
+        self.D = device.Device(A, P, B, debug=True)
+
+    def tearDown(self):
+        pass
+
+    def test_handle(self):
+        for name in registers.parameters:
+            h = self.D.handle(name)
+            self.assertTrue(isinstance(h, int))
+
+            self.D[h] = 1
+            self.assertTrue(self.D[name] == 1, name)
+            self.D[name] = 0
+            self.assertTrue(self.D[h] == 0, name)
+
+    def test_layout(self):
+        # Compiled layout agrees with pack_bits/unpack_bits on the raw description
+        for name, values in self.D._parameters.items():
+            layout = self.D._lookup[name]
+            for R, (register, reg_shift, reg_mask, dat_shift) in zip(values, layout.fields):
+                val = 0xFFFFF
+                bits = device.unpack_bits(val, R['dat_MSB'], R['dat_LSB'])
+                tst = ((val >> dat_shift) << reg_shift) & reg_mask
+                self.assertTrue(tst == device.pack_bits(bits, R['reg_MSB'], R['reg_LSB']), name)
+
+    def test_dynamic_map(self):
+        # A map built at runtime is compiled afresh for every Device, so changes show up
+        P = {'A': [{'register': 10, 'reg_MSB': 7, 'reg_LSB': 0}]}
+        D = device.Device(None, P, None, debug=True)
+        self.assertFalse('B' in D._lookup)
+
+        P['B'] = [{'register': 11, 'reg_MSB': 3, 'reg_LSB': 0}]
+        D = device.Device(None, P, None, debug=True)
+        D['B'] = 5
+        self.assertTrue(D['B'] == 5)
+
+    def test_compiled_shared(self):
+        # The bundled map is compiled once and shared by every Clock
+        C1 = clock.Clock(debug=True)
+        C2 = clock.Clock(debug=True)
+        self.assertTrue(C1._lookup is C2._lookup)
+        self.assertFalse(hasattr(device, '_compiled'))
+
+
+
+class FakeSMBus(bus.MemoryBus):
+    """In-memory bus that counts bus transactions
+    """
+    def __init__(self):
+        super().__init__()
+        self.regs = self.register_file(registers.address)
+        self.reads = 0
+        self.writes = 0
+
+    def read_byte_data(self, address, register):
+        self.reads += 1
+        return super().read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value):
+        self.writes += 1
+        super().write_byte_data(address, register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+        self.reads += 1
+        return super().read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        assert len(data) <= device.I2C_BLOCK_MAX
+        self.writes += 1
+        super().write_i2c_block_data(address, register, data)
+
+
+
+def fake_device(**kwargs):
+    return device.Device(registers.address, registers.parameters, FakeSMBus(), **kwargs)
+
+
+
+class TestShadow(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device(shadow=True, volatile=registers.volatile)
+        self.bus = self.D._bus
+
+    def tearDown(self):
+        pass
+
+    def test_set_get(self):
+        for name, values in registers.parameters.items():
+            for val in [1, 0]:
+                self.D[name] = val
+                tst = self.D[name]
+                self.assertTrue(tst == val, (name, tst, val))
+
+    def test_prior_byte_from_shadow(self):
+        self.D['CLK0_OEB'] = 1
+        reads = self.bus.reads
+        for k in range(1, 8):
+            self.D['CLK{}_OEB'.format(k)] = 1
+        self.assertTrue(self.bus.reads == reads, (self.bus.reads, reads))
+        self.assertTrue(self.D.read_byte(3) == 255)
+
+    def test_volatile(self):
+        self.D['PLLA_RST'] = 1
+        self.bus.regs[177] = 0  # self-clearing
+        reads = self.bus.reads
+        self.D['PLLB_RST'] = 1
+        self.assertTrue(self.bus.reads == reads + 1)
+        self.assertTrue(self.D['PLLA_RST'] == 0)
+
+    def test_invalidate_resync(self):
+        self.D['CLK0_OEB'] = 1
+        self.bus.regs[3] = 0  # device changed behind our back
+
+        self.D.invalidate(3)
+        self.D['CLK1_OEB'] = 1
+        self.assertTrue(self.D['CLK0_OEB'] == 0)
+
+        self.bus.regs[3] = 0
+        self.bus.reads = 0
+        self.D.resync()
+        self.assertTrue(self.bus.reads <= 8, self.bus.reads)
+
+        self.D['CLK2_OEB'] = 1
+        self.assertTrue(self.D.read_byte(3) == 0b100)
+
+
+
+class TestFastPath(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device(shadow=True, volatile=registers.volatile)
+        self.bus = self.D._bus
+        self.D.resync()
+
+    def tearDown(self):
+        pass
+
+    def count_calls(self, func, *args):
+        """Number of Python and builtin calls made by func(*args)"""
+        calls = [0]
+
+        def profile(frame, event, arg):
+            if event in ('call', 'c_call'):
+                calls[0] += 1
+
+        sys.setprofile(profile)
+        try:
+            func(*args)
+        finally:
+            sys.setprofile(None)
+
+        return calls[0]
+
+    def test_transactions(self):
+        self.bus.reads = self.bus.writes = 0
+        self.D['CLK0_OEB'] = 1
+        self.D['MS0_P1'] = 1234
+        self.assertTrue(self.bus.reads == 0 and self.bus.writes == 2)
+        self.assertTrue(self.D['CLK0_OEB'] == 1 and self.D['MS0_P1'] == 1234)
+
+    def test_call_count(self):
+        for name in ['CLK0_OEB', 'MS0_P1']:
+            fast = self.count_calls(self.D.set_parameter, name, 1)
+            generic = self.count_calls(self.D.set_parameters, {name: 1})
+            self.assertTrue(fast <= 20, (name, fast))
+            self.assertTrue(2*fast <= generic, (name, fast, generic))
+
+    def test_values(self):
+        # Fast path and generic path agree, including bits shared with other parameters
+        other = fake_device()
+        for name in ['CLK0_OEB', 'CLK0_IDRV', 'MS0_P1', 'MSNA_P3', 'R0_DIV']:
+            for value in [1, 2, 3]:
+                self.D.set_parameter(name, value)
+                other.set_parameters({name: value})
+        self.assertTrue(self.bus.regs == other._bus.regs)
+
+
+
+class TestBurstWrite(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device()
+        self.bus = self.D._bus
+
+    def tearDown(self):
+        pass
+
+    def test_contiguous_runs(self):
+        data = {5: 1, 3: 2, 4: 3, 9: 4}
+        tst = device.contiguous_runs(data)
+        val = [(3, [2, 3, 1]), (9, [4])]
+        self.assertTrue(tst == val, (tst, val))
+
+        data = dict((k, 0) for k in range(70))
+        tst = [len(run) for start, run in device.contiguous_runs(data)]
+        self.assertTrue(tst == [32, 32, 6], tst)
+
+    def test_multi_register_parameter(self):
+        val = 0x2ABCD
+        self.D['MS0_P1'] = val
+        self.assertTrue(self.bus.writes == 1, self.bus.writes)
+        self.assertTrue(self.D['MS0_P1'] == val)
+
+    def test_set_parameters(self):
+        values = {'MSNA_P1': 0x3ABCD, 'MSNA_P2': 0xFEDCB, 'MSNA_P3': 0x98765}
+        self.D.set_parameters(values)
+        self.assertTrue(self.bus.writes == 1, self.bus.writes)
+
+        for name, val in values.items():
+            tst = self.D[name]
+            self.assertTrue(tst == val, (name, tst, val))
+
+    def test_preserve_bits(self):
+        self.D['R0_DIV'] = 0b101
+        self.D['MS0_P1'] = 0x3FFFF
+        self.assertTrue(self.D['R0_DIV'] == 0b101)
+
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device()
+        self.bus = self.D._bus
+
+    def tearDown(self):
+        pass
+
+    def test_deferred(self):
+        with self.D.batch():
+            self.D['CLK0_OEB'] = 1
+            self.D['MS0_P1'] = 0x1234
+            self.assertTrue(self.bus.writes == 0)
+            self.assertTrue(self.D['CLK0_OEB'] == 0)
+
+        self.assertTrue(self.D['CLK0_OEB'] == 1)
+        self.assertTrue(self.D['MS0_P1'] == 0x1234)
+
+    def test_full_register_no_read(self):
+        with self.D.batch():
+            for k in range(8):
+                self.D['CLK{}_OEB'.format(k)] = 1
+
+        self.assertTrue(self.bus.reads == 0, self.bus.reads)
+        self.assertTrue(self.bus.writes == 1, self.bus.writes)
+        self.assertTrue(self.bus.regs[3] == 255)
+
+    def test_last_value_wins(self):
+        with self.D.batch():
+            self.D['CLK0_IDRV'] = 3
+            self.D['CLK0_SRC'] = 2
+            self.D['CLK0_IDRV'] = 1
+
+        self.assertTrue(self.D['CLK0_IDRV'] == 1)
+        self.assertTrue(self.D['CLK0_SRC'] == 2)
+
+    def test_nested(self):
+        with self.D.batch():
+            with self.D.batch():
+                self.D['CLK0_OEB'] = 1
+            self.assertTrue(self.bus.writes == 0)
+
+        self.assertTrue(self.bus.writes == 1)
+
+    def test_exception_discards(self):
+        try:
+            with self.D.batch():
+                self.D['CLK0_OEB'] = 1
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        self.assertTrue(self.bus.writes == 0)
+        self.D['CLK1_OEB'] = 1
+        self.assertTrue(self.bus.regs[3] == 0b10)
+
+    def test_clock_reset(self):
+        C = clock.Clock(bus=FakeSMBus())
+        C.reset()
+
+        self.assertTrue(C._bus.writes <= 4, C._bus.writes)
+        self.assertTrue(C._bus.regs[3] == 255)
+        for k in range(8):
+            self.assertTrue(C['CLK{}_PDN'.format(k)] == 1)
+
+
+
+class TestBatchThreads(unittest.TestCase):
+    def test_other_thread(self):
+        B = FakeSMBus()
+        C = clock.Clock(bus=B)
+        entered = threading.Event()
+        written = threading.Event()
+
+        def batch():
+            try:
+                with C.batch():
+                    C['CLK0_OEB'] = 1
+                    entered.set()
+                    written.wait()
+                    raise RuntimeError('abort')
+            except RuntimeError:
+                pass
+
+        thread = threading.Thread(target=batch)
+        thread.start()
+        entered.wait()
+
+        # Written right away, not swallowed by the other thread's batch
+        C['CLK5_OEB'] = 1
+        self.assertTrue(B.regs[3] == 0b00100000)
+
+        written.set()
+        thread.join()
+        self.assertTrue(C['CLK5_OEB'] == 1)
+        self.assertTrue(C['CLK0_OEB'] == 0)
+
+
+
+class TestBulkRead(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device()
+        self.bus = self.D._bus
+        for k in range(len(self.bus.regs)):
+            self.bus.regs[k] = (k*37 + 11) % 256
+
+    def tearDown(self):
+        pass
+
+    def test_covering_spans(self):
+        tst = device.covering_spans([3, 0, 2, 16, 31, 32, 40, 187])
+        val = [(0, 32), (32, 41), (187, 188)]
+        self.assertTrue(tst == val, (tst, val))
+
+    def test_get_parameters(self):
+        names = sorted(registers.parameters)
+        tst = self.D.get_parameters(names)
+        for name in names:
+            self.assertTrue(tst[name] == self.D[name], name)
+
+    def test_single_transaction(self):
+        names = ['MS{}_P{}'.format(ms, p) for ms in range(3) for p in range(1, 4)]
+        self.D.get_parameters(names)
+        self.assertTrue(self.bus.reads == 1, self.bus.reads)
+
+    def test_status(self):
+        C = clock.Clock(bus=FakeSMBus())
+        with mock.patch('builtins.print'):
+            C.status_PLL('A')
+            C.status_MS(0)
+        self.assertTrue(C._bus.reads <= 4, C._bus.reads)
+
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.D = fake_device(volatile=registers.volatile)
+        self.bus = self.D._bus
+
+    def tearDown(self):
+        pass
+
+    def test_snapshot(self):
+        for k in range(len(self.bus.regs)):
+            self.bus.regs[k] = k
+        image = self.D.snapshot()
+        self.assertTrue(len(image) == 188, len(image))
+        self.assertTrue(image == self.bus.regs[:188])
+        self.assertTrue(self.bus.reads == 6, self.bus.reads)
+
+    def test_restore(self):
+        self.D.set_parameters({'MSNA_P1': 0x3ABCD, 'MS0_P1': 0x12345, 'CLK0_OEB': 1})
+        image = self.D.snapshot()
+
+        self.D.set_parameters({'MSNA_P1': 0, 'MS0_P1': 0, 'CLK0_OEB': 0, 'PLLA_RST': 1})
+        self.bus.writes = 0
+        data = self.D.restore(image)
+
+        self.assertTrue(self.bus.writes == 3, self.bus.writes)
+        self.assertTrue(177 not in data)
+        self.assertTrue(self.D['MSNA_P1'] == 0x3ABCD)
+        self.assertTrue(self.D['MS0_P1'] == 0x12345)
+        self.assertTrue(self.D['CLK0_OEB'] == 1)
+
+    def test_restore_unchanged(self):
+        image = self.D.snapshot()
+        self.bus.writes = 0
+        data = self.D.restore(image)
+        self.assertTrue(data == {} and self.bus.writes == 0)
+
+
+
+class TestBackend(unittest.TestCase):
+    def test_memory_bus(self):
+        B = bus.MemoryBus()
+        D1 = device.Device(0x60, registers.parameters, B)
+        D2 = device.Device(0x61, registers.parameters, B)
+
+        D1['MS0_P1'] = 1234
+        D2['MS0_P1'] = 5678
+        self.assertTrue(D1['MS0_P1'] == 1234)
+        self.assertTrue(D2['MS0_P1'] == 5678)
+
+    def test_invalid_backend(self):
+        self.assertRaises(TypeError, device.Device, 0x60, registers.parameters, object())
+
+    def test_smbus_lazy(self):
+        with mock.patch.object(bus, 'SMBus') as smbus:
+            D = device.Device(0x60, registers.parameters, 1)
+        smbus.assert_called_once_with(1)
+        D.close()
+
+    def test_clock(self):
+        C = clock.Clock(debug=True)
+        C.reset()
+        C.config_PLL(800e6)
+        C.config_MS(10e6, 0)
+        self.assertTrue(C['MSNA_P3'] > 0)
+
+
+
+class SlowBus(bus.MemoryBus):
+    """Memory bus yielding to other threads between read and write"""
+    def read_byte_data(self, address, register):
+        value = super().read_byte_data(address, register)
+        time.sleep(0.0005)
+        return value
+
+
+
+class TestSharedBus(unittest.TestCase):
+    def test_pool(self):
+        with mock.patch.object(bus, 'SMBus', side_effect=lambda number: mock.Mock(spec=bus.MemoryBus)) as smbus:
+            D1 = device.Device(0x60, registers.parameters, 7)
+            D2 = device.Device(0x61, registers.parameters, 7)
+            D3 = device.Device(0x60, registers.parameters, 8)
+
+        self.assertTrue(smbus.call_count == 2)
+        self.assertTrue(D1._handle is D2._handle)
+        self.assertTrue(D1.lock is D2.lock)
+        self.assertTrue(D1._handle is not D3._handle)
+        self.assertTrue(D1._handle.refs == 2)
+
+        backend = D1._bus
+        D1.close()
+        D1.close()
+        self.assertTrue(D2._handle.refs == 1)
+        self.assertFalse(backend.close.called)
+
+        D2.close()
+        self.assertTrue(backend.close.called)
+        self.assertTrue(7 not in bus._pool)
+
+        with D3:
+            pass
+        self.assertTrue(8 not in bus._pool)
+
+    def test_backend_object(self):
+        B = FakeSMBus()
+        with mock.patch.object(B, 'close') as close:
+            D1 = device.Device(0x60, registers.parameters, B)
+            D2 = device.Device(0x60, registers.parameters, B)
+            self.assertTrue(D1.lock is D2.lock)
+
+            D1.close()
+            D2.close()
+
+        # Owned by the caller, left open
+        self.assertFalse(close.called)
+
+    def test_debug(self):
+        D1 = device.Device(0x60, registers.parameters, None, debug=True)
+        D2 = device.Device(0x60, registers.parameters, None, debug=True)
+        self.assertTrue(D1._bus is not D2._bus)
+        self.assertTrue(D1.lock is not D2.lock)
+
+    def test_read_modify_write(self):
+        # Eight threads, each setting its own bit of register 3 through its own Device
+        B = SlowBus()
+        devices = [device.Device(registers.address, registers.parameters, B) for k in range(8)]
+
+        for trial in range(5):
+            devices[0].write_byte(3, 0)
+            barrier = threading.Barrier(8)
+
+            def worker(k):
+                barrier.wait()
+                devices[k]['CLK{}_OEB'.format(k)] = 1
+
+            threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertTrue(B.register_file(registers.address)[3] == 0xFF)
+
+        for D in devices:
+            D.close()
+
+    def test_read_while_write(self):
+        # MS0_P1 spans three registers, a reader must never see half of a write
+        B = SlowBus()
+        writer = device.Device(registers.address, registers.parameters, B)
+        reader = device.Device(registers.address, registers.parameters, B)
+        writer['MS0_P1'] = 0
+
+        done = threading.Event()
+
+        def toggle():
+            k = 0
+            while not done.is_set():
+                k += 1
+                writer['MS0_P1'] = 0x3FFFF if k % 2 else 0
+
+        thread = threading.Thread(target=toggle)
+        thread.start()
+        try:
+            values = set(reader['MS0_P1'] for k in range(100))
+        finally:
+            done.set()
+            thread.join()
+
+        self.assertTrue(values <= set([0, 0x3FFFF]), values)
+
+        writer.close()
+        reader.close()
+
+
+
+class TestRetune(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeSMBus()
+        self.C = clock.Clock(bus=self.bus)
+        self.C.config_PLL(800e6)
+        self.C.config_MS(10e6, 0)
+        self.C['R0_DIV'] = 0b101
+
+    def tearDown(self):
+        pass
+
+    def check(self, MS, f):
+        a, b, c = clock.compute_abc(self.C.f_PLL['A']/f)
+        P = clock.encode_abc(a, b, c)
+        for k in range(3):
+            self.assertTrue(self.C['MS{}_P{}'.format(MS, k+1)] == P[k])
+        self.assertTrue(self.C['MS{}_INT'.format(MS)] == int(b == 0 and not a % 2))
+        self.assertTrue(self.C['R0_DIV'] == 0b101)
+
+    def test_retune(self):
+        for f in [10.1e6, 10.1001e6, 10.1002e6, 12e6, 10e6]:
+            self.bus.writes = 0
+            f_set = self.C.retune(0, f)
+            self.assertAlmostEqual(f_set, f, delta=1e-3)
+            self.assertTrue(self.bus.writes <= 2, self.bus.writes)
+            self.assertTrue(self.C.retune_latency > 0)
+            self.check(0, f)
+
+    def test_unchanged(self):
+        self.C.retune(0, 10.1e6)
+        self.bus.writes = 0
+        self.C.retune(0, 10.1e6)
+        self.assertTrue(self.bus.writes == 0)
+        self.assertTrue(self.C.retune_bytes == 0)
+
+    def test_partial(self):
+        # Same denominator, only P2 changes
+        self.C.retune(0, 800e6/(80 + 1/1009))
+        self.C.retune(0, 800e6/(80 + 2/1009))
+        self.assertTrue(self.C.retune_bytes <= 2, self.C.retune_bytes)
+
+    def test_shared_bits(self):
+        # Bits sharing registers with the divider, written after the first retune
+        self.C.retune(0, 10.5e6)
+        self.C['CLK0_PDN'] = 1
+        self.C['CLK0_IDRV'] = 3
+        self.C['R0_DIV'] = 3
+        self.C['MS0_DIVBY4'] = 0
+
+        self.C.retune(0, 20e6)
+        self.assertTrue(self.C['CLK0_PDN'] == 1)
+        self.assertTrue(self.C['CLK0_IDRV'] == 3)
+        self.assertTrue(self.C['R0_DIV'] == 3)
+
+        self.C.retune(0, 20.5e6)
+        self.assertTrue(self.C['R0_DIV'] == 3)
+        self.assertTrue(self.C['CLK0_PDN'] == 1)
+
+    def test_after_reset(self):
+        self.C.retune(0, 10.5e6)
+        self.C.reset()
+        self.C.retune(0, 20e6)
+        self.assertTrue(self.C['CLK0_PDN'] == 1)
+
+
+
+class TestStatus(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeSMBus()
+        for k in range(len(self.bus.regs)):
+            self.bus.regs[k] = (k*53 + 7) % 256
+        self.C = clock.Clock(bus=self.bus)
+
+    def tearDown(self):
+        pass
+
+    def test_record(self):
+        record = self.C.status(verbose=False)
+        self.assertTrue(sorted(record['PLL']) == ['A', 'B'])
+        self.assertTrue(sorted(record['MS']) == list(range(8)))
+        self.assertTrue(sorted(record['CLK']) == list(range(8)))
+
+        for group in ['PLL', 'MS', 'CLK']:
+            for x, values in record[group].items():
+                for name, value in values.items():
+                    self.assertTrue(self.C[name] == value, name)
+        for name, value in record['SYS'].items():
+            self.assertTrue(self.C[name] == value, name)
+
+    def test_bulk_read(self):
+        self.C.status(verbose=False)
+        self.assertTrue(self.bus.reads <= 8, self.bus.reads)
+
+    def test_image(self):
+        image = self.C.snapshot()
+        reads = self.bus.reads
+        record = self.C.read_status(image)
+        self.assertTrue(self.bus.reads == reads)
+        self.assertTrue(record == self.C.read_status())
+
+    def test_print(self):
+        with mock.patch('builtins.print') as printer:
+            record = self.C.status()
+        text = printer.call_args[0][0]
+        self.assertTrue(text == clock.format_status(record))
+        self.assertTrue('MSNA_P1' in text and 'CLK7_DIS_STATE' in text)
+
+
+
+class TestResetImage(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeSMBus()
+        for k in range(len(self.bus.regs)):
+            self.bus.regs[k] = 0x55
+        self.C = clock.Clock(bus=self.bus)
+
+    def tearDown(self):
+        pass
+
+    def test_image(self):
+        image = self.C.reset_image
+        self.assertTrue(image[3] == (0xFF, 0xFF))
+        self.assertTrue(image[24] == (0xFF, 0x00) and image[25] == (0xFF, 0x00))
+        for register in range(16, 24):
+            self.assertTrue(image[register] == (0x80, 0x80), register)
+
+    def test_reset(self):
+        self.C.reset()
+        self.assertTrue(self.bus.reads <= 2, self.bus.reads)
+        self.assertTrue(self.bus.writes <= 3, self.bus.writes)
+
+        for name, value in clock.reset_values.items():
+            self.assertTrue(self.C[name] == value, name)
+
+        # Bits outside of the reset parameters left alone
+        self.assertTrue(self.C['CLK0_SRC'] == 0b01)
+
+    def test_extend(self):
+        self.C.reset_values['XTAL_CL'] = constants.XTAL_CL_8PF
+        self.C.compile_reset()
+        self.C.reset()
+        self.assertTrue(self.C['XTAL_CL'] == constants.XTAL_CL_8PF)
+        self.assertTrue('XTAL_CL' not in clock.reset_values)
+
+    def test_batch(self):
+        with self.C.batch():
+            self.C.reset()
+            self.C['CLK0_OEB'] = constants.CLK_OEB_ENABLE
+        self.assertTrue(self.C['CLK0_OEB'] == constants.CLK_OEB_ENABLE)
+        self.assertTrue(self.C['CLK1_OEB'] == constants.CLK_OEB_DISABLE)
+
+
+
 #------------------------------------------------
 if __name__ == '__main__':
     unittest.main(verbosity=2)
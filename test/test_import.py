@@ -0,0 +1,61 @@
+
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import sys
+import pathlib
+import subprocess
+
+import context
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+_path_package = _path_module.parent
+
+# Budget for 'import snail.Si5351_Clock' on top of the standard library modules it
+# always needs, seconds.  Relative to the interpreter's own import costs, so the
+# package's share is measured rather than the machine's.
+IMPORT_BUDGET = 0.05
+
+# Optional or lazily imported, must not be loaded by 'import snail.Si5351_Clock'
+LAZY_MODULES = ['numpy', 'smbus2', 'asyncio', 'pickle', 'sqlite3', 'hashlib']
+
+_script = """
+import sys, time
+import os, math, fractions, threading, contextlib, functools, collections
+t0 = time.perf_counter()
+import snail.Si5351_Clock
+t1 = time.perf_counter()
+print(t1 - t0, ','.join(name for name in {} if name in sys.modules) or '-')
+""".format(LAZY_MODULES)
+
+def measure_import():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = str(_path_package)
+    output = subprocess.check_output([sys.executable, '-c', _script], env=env, cwd=str(_path_package))
+    seconds, loaded = output.decode().split()
+
+    return float(seconds), [name for name in loaded.split(',') if name != '-']
+
+
+#------------------------------------------------
+
+class TestImport(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_no_heavy_imports(self):
+        seconds, loaded = measure_import()
+        self.assertTrue(loaded == [], loaded)
+
+    def test_import_budget(self):
+        seconds = min(measure_import()[0] for k in range(3))
+        self.assertLess(seconds, IMPORT_BUDGET)
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,416 @@
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import time
+import asyncio
+import sys
+import tempfile
+import subprocess
+import pathlib
+import threading
+
+import numpy as np
+
+import context
+
+from snail import memoize
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestMemoize(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def func(a, b=0):
+            self.calls.append((a, b))
+            return a + b
+
+        self.func = func
+
+    def tearDown(self):
+        pass
+
+    def test_cached(self):
+        f = memoize.Memoize(self.func)
+        self.assertTrue(f(1, 2) == 3)
+        self.assertTrue(f(1, 2) == 3)
+        self.assertTrue(f(1, b=2) == 3)
+        self.assertTrue(f(1, b=2) == 3)
+        self.assertTrue(len(self.calls) == 2)
+
+        info = f.cache_info()
+        self.assertTrue(info.hits == 2 and info.misses == 2)
+        self.assertTrue(info.maxsize == memoize.MAXSIZE and info.currsize == 2)
+
+    def test_unhashable(self):
+        f = memoize.Memoize(self.func)
+        self.assertTrue(f([1], [2]) == [1, 2])
+        self.assertTrue(f([1], [2]) == [1, 2])
+        self.assertTrue(len(self.calls) == 1)
+
+    def test_kwargs_order(self):
+        f = memoize.Memoize(lambda **kwargs: sorted(kwargs.items()))
+        f(a=1, b=[2])
+        f(b=[2], a=1)
+        f(a=1, b=2)
+        f(b=2, a=1)
+        self.assertTrue(f.cache_info().misses == 2)
+
+    def test_no_collision(self):
+        f = memoize.Memoize(lambda *args, **kwargs: (args, kwargs))
+
+        # Structural key of the first call spelled out as plain arguments
+        key = memoize.make_key(([1, 2],), {'x': 1})
+        self.assertTrue(f([1, 2], x=1) == (([1, 2],), {'x': 1}))
+        self.assertTrue(f(*key[1], x=1) == (key[1], {'x': 1}))
+
+        self.assertTrue(f([1, 2]) != f((1, 2)))
+        self.assertTrue(f.cache_info().misses == 4)
+
+    def test_arrays(self):
+        class NoPickle(np.ndarray):
+            def __reduce__(self):
+                raise AssertionError('pickled')
+
+        f = memoize.Memoize(lambda x: float(np.sum(x)))
+        a = np.arange(12.).reshape(3, 4).view(NoPickle)
+        self.assertTrue(f(a) == 66.)
+        self.assertTrue(f(a.copy()) == 66.)
+        self.assertTrue(f(a.T) == 66.)
+        self.assertTrue(f(np.ascontiguousarray(a.T).view(NoPickle)) == 66.)
+        self.assertTrue(f.cache_info().misses == 2)
+
+        # Same bytes, different dtype or shape
+        f(a.reshape(4, 3))
+        f(np.arange(12, dtype=np.int64).reshape(3, 4).view(NoPickle))
+        self.assertTrue(f.cache_info().misses == 4)
+
+        a[0, 0] = 100.
+        self.assertTrue(f(a) == 166.)
+
+    def test_nested(self):
+        f = memoize.Memoize(lambda x: len(x))
+        f({'b': [1, 2], 'a': {3, 4}})
+        f({'a': {4, 3}, 'b': [1, 2]})
+        f({'a': {4, 3}, 'b': (1, 2)})
+        f([bytearray(b'ab'), {1: 'x', 'y': 2}])
+        f([bytearray(b'ab'), {'y': 2, 1: 'x'}])
+        self.assertTrue(f.cache_info().misses == 3)
+
+    def test_lru(self):
+        f = memoize.memoize(maxsize=2)(self.func)
+        f(1)
+        f(2)
+        f(1)
+        f(3)   # evicts 2, least recently used
+        self.assertTrue(f.cache_info().currsize == 2)
+
+        del self.calls[:]
+        f(1)
+        f(3)
+        self.assertTrue(self.calls == [])
+
+        f(2)
+        self.assertTrue(self.calls == [(2, 0)])
+        self.assertTrue(f.cache_info().evictions == 2)
+
+    def test_unbounded(self):
+        f = memoize.Memoize(self.func, maxsize=None)
+        for k in range(2*memoize.MAXSIZE):
+            f(k)
+        self.assertTrue(f.cache_info().currsize == 2*memoize.MAXSIZE)
+        self.assertTrue(f.cache_info().evictions == 0)
+
+    def test_ttl(self):
+        now = [0.]
+        f = memoize.Memoize(self.func, ttl=10, timer=lambda: now[0])
+        f(1)
+        now[0] = 9.
+        f(1)
+        self.assertTrue(len(self.calls) == 1)
+
+        now[0] = 10.
+        f(1)
+        self.assertTrue(len(self.calls) == 2)
+        self.assertTrue(f.cache_info().evictions == 1)
+
+        f(2)
+        now[0] = 25.
+        f.expire()
+        info = f.cache_info()
+        self.assertTrue(info.currsize == 0 and info.evictions == 3)
+
+    def test_threads(self):
+        f = memoize.memoize(maxsize=16)(lambda x: x*x)
+
+        def worker(n):
+            for k in range(2000):
+                self.assertTrue(f(k % 32) == (k % 32)**2)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        info = f.cache_info()
+        self.assertTrue(info.hits + info.misses == 8*2000)
+        self.assertTrue(info.currsize <= 16)
+        self.assertTrue(info.misses - info.evictions >= info.currsize)
+
+    def test_clear(self):
+        f = memoize.memoize(maxsize=8)(self.func)
+        f(1)
+        f(1)
+        f.cache_clear()
+        self.assertTrue(f.cache_info() == (0, 0, 0, 8, 0))
+
+        f(1)
+        self.assertTrue(len(self.calls) == 2)
+
+    def test_wraps(self):
+        def documented(x):
+            """Docstring
+            """
+            return x
+
+        f = memoize.Memoize(documented)
+        self.assertTrue(f.__name__ == 'documented')
+        self.assertTrue(f.__doc__ == documented.__doc__)
+
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def tearDown(self):
+        pass
+
+    def run_threads(self, f, args, N=8):
+        results = [None]*N
+        errors = [None]*N
+
+        def worker(k):
+            try:
+                results[k] = f(*args)
+            except Exception as error:
+                errors[k] = error
+
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(N)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return results, errors
+
+    def test_threads(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(x):
+            self.calls.append(x)
+            started.set()
+            release.wait()
+            return [x]
+
+        f = memoize.Memoize(slow, single_flight=True)
+
+        leader = threading.Thread(target=f, args=(5,))
+        leader.start()
+        started.wait()
+
+        # Followers arrive while the leader is still computing
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results, errors = self.run_threads(f, (5,))
+        leader.join()
+
+        self.assertTrue(self.calls == [5])
+        self.assertTrue(all(result == [5] for result in results))
+        self.assertTrue(f.coalesced + f.hits == 8)
+
+    def test_not_single_flight(self):
+        barrier = threading.Barrier(4)
+
+        def slow(x):
+            self.calls.append(x)
+            barrier.wait()
+            return x
+
+        f = memoize.Memoize(slow)
+        self.run_threads(f, (5,), N=4)
+        self.assertTrue(len(self.calls) == 4)
+
+    def test_exception(self):
+        def fail(x):
+            self.calls.append(x)
+            time.sleep(0.05)
+            raise ValueError(x)
+
+        f = memoize.Memoize(fail, single_flight=True)
+        results, errors = self.run_threads(f, (5,))
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertTrue(f.cache_info().currsize == 0)
+
+        # Not cached, the next call tries again
+        calls = len(self.calls)
+        self.assertRaises(ValueError, f, 5)
+        self.assertTrue(len(self.calls) == calls + 1)
+
+    def test_recursive(self):
+        @memoize.memoize(single_flight=True)
+        def fib(n):
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+        self.assertTrue(fib(30) == 832040)
+
+    def test_async(self):
+        async def slow(x):
+            self.calls.append(x)
+            await asyncio.sleep(0.01)
+            return [x]
+
+        f = memoize.Memoize(slow, single_flight=True)
+
+        async def main():
+            results = await asyncio.gather(*[f(5) for k in range(8)])
+            results.append(await f(5))
+            return results
+
+        results = asyncio.run(main())
+        self.assertTrue(self.calls == [5])
+        self.assertTrue(all(result == [5] for result in results))
+        self.assertTrue(f.coalesced == 7 and f.hits == 1)
+
+    def test_async_not_single_flight(self):
+        async def slow(x):
+            self.calls.append(x)
+            await asyncio.sleep(0.01)
+            return x
+
+        f = memoize.Memoize(slow)
+
+        async def main():
+            await asyncio.gather(*[f(5) for k in range(4)])
+            return await f(5)
+
+        self.assertTrue(asyncio.run(main()) == 5)
+        self.assertTrue(len(self.calls) == 4)
+        self.assertTrue(f.hits == 1)
+
+    def test_async_cancel(self):
+        async def slow(x):
+            self.calls.append(x)
+            await asyncio.sleep(0.02)
+            return x
+
+        f = memoize.Memoize(slow, single_flight=True)
+
+        async def main():
+            leader = asyncio.ensure_future(f(5))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(f(5))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertTrue(asyncio.run(main()) == 5)
+        self.assertTrue(self.calls == [5])
+
+
+
+class TestSQLiteStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'cache.sqlite')
+        self.calls = []
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def square(self, x):
+        self.calls.append(x)
+        return {'x': x, 'y': [x*x]}
+
+    def memoized(self, version='1', **kwargs):
+        return memoize.Memoize(self.square, store=memoize.SQLiteStore(self.path), version=version, **kwargs)
+
+    def test_restart(self):
+        f = self.memoized()
+        self.assertTrue(f(3) == {'x': 3, 'y': [9]})
+        self.assertTrue(f(3) == {'x': 3, 'y': [9]})
+
+        # Fresh cache and connection, as after a restart or in another process
+        g = self.memoized()
+        self.assertTrue(g(3) == {'x': 3, 'y': [9]})
+        self.assertTrue(self.calls == [3])
+        self.assertTrue(g.store_hits == 1)
+
+    def test_structural(self):
+        def func(a, b=None):
+            self.calls.append(a)
+            return len(a)
+
+        f = memoize.Memoize(func, store=memoize.SQLiteStore(self.path))
+        f([1, 2], b={'c': {5, 6}, 'd': 'x'})
+
+        g = memoize.Memoize(func, store=memoize.SQLiteStore(self.path))
+        g([1, 2], b={'d': 'x', 'c': {6, 5}})
+        self.assertTrue(len(self.calls) == 1)
+
+    def test_version(self):
+        f = self.memoized(version='1')
+        f(3)
+
+        g = self.memoized(version='2')
+        g(3)
+        self.assertTrue(self.calls == [3, 3])
+
+        store = memoize.SQLiteStore(self.path)
+        self.assertTrue(store.prune(g.name, '2') == 1)
+        self.assertTrue(store.get(g.name, '2', memoize.persistent_key((3,), {}))[0])
+
+    def test_clear(self):
+        f = self.memoized()
+        f(3)
+        f.cache_clear()
+
+        g = self.memoized()
+        g(3)
+        self.assertTrue(self.calls == [3, 3])
+
+    def test_ttl(self):
+        f = self.memoized(ttl=-1)
+        f(3)
+
+        g = self.memoized()
+        g(3)
+        self.assertTrue(self.calls == [3, 3])
+
+    def test_unpicklable(self):
+        f = memoize.Memoize(lambda x: (lambda: x), store=memoize.SQLiteStore(self.path))
+        self.assertTrue(f(3)() == 3)
+        self.assertTrue(f(3)() == 3)
+
+    def test_subprocess(self):
+        f = self.memoized()
+        f(7)
+
+        code = ('import sys; sys.path.insert(0, {!r}); from snail import memoize; '
+                'store = memoize.SQLiteStore({!r}); '
+                'print(store.get({!r}, "1", memoize.persistent_key((7,), {{}})))').format(
+                str(_path_module.parent), self.path, f.name)
+        output = subprocess.check_output([sys.executable, '-c', code]).decode()
+        self.assertTrue(output.strip() == "(True, {'x': 7, 'y': [49]})", output)
+
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
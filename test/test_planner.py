@@ -0,0 +1,110 @@
+
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import pathlib
+import tempfile
+
+import context
+
+from snail import memoize
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import constants
+from snail.Si5351_Clock import planner
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.C = clock.Clock(debug=True)
+
+    def tearDown(self):
+        pass
+
+    def check_plan(self, plan, targets):
+        self.assertTrue(sorted(plan.outputs) == sorted(targets))
+        for x, info in plan.PLL.items():
+            self.assertTrue(constants.F_PLL_MIN <= info['f'] <= constants.F_PLL_MAX, info)
+
+        for MS, out in plan.outputs.items():
+            self.assertTrue(out['PLL'] in plan.PLL)
+            self.assertLess(out['ppm'], 1e-3, (MS, out))
+
+            a, b, c = out['abc']
+            lo, hi = planner.divider_limits(MS)
+            self.assertTrue(lo <= a + b/c <= hi, (MS, out))
+            if MS >= 6:
+                self.assertTrue(b == 0 and a % 2 == 0, (MS, out))
+
+    def test_single(self):
+        targets = {0: 10e6}
+        plan = self.C.plan(targets)
+        self.check_plan(plan, targets)
+        self.assertTrue(plan.outputs[0]['penalty'] == planner.PENALTY_EVEN)
+
+    def test_even_integer(self):
+        targets = {0: 10e6, 1: 14.07e6, 2: 3.6e6}
+        plan = self.C.plan(targets)
+        self.check_plan(plan, targets)
+        self.assertTrue(plan.ppm == 0)
+        self.assertTrue(plan.penalty == 0)
+
+    def test_all_outputs(self):
+        targets = dict((k, 1e6*(k + 1.2345)) for k in range(8))
+        plan = self.C.plan(targets)
+        self.check_plan(plan, targets)
+
+    def test_low_frequency(self):
+        targets = {3: 3000, 6: 12.5e6}
+        plan = self.C.plan(targets)
+        self.check_plan(plan, targets)
+        self.assertTrue(plan.outputs[3]['R'] == 128)
+
+    def test_out_of_range(self):
+        self.assertRaises(ValueError, self.C.plan, {0: 200e6})
+        self.assertRaises(ValueError, self.C.plan, {8: 10e6})
+
+    def test_cached(self):
+        targets = {0: 10e6, 1: 14.07e6}
+        self.assertTrue(self.C.plan(targets) is self.C.plan(targets))
+
+    def test_persistent(self):
+        targets = {0: 10.5e6, 1: 14.07e6}
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'cache.sqlite')
+            try:
+                clock.persist_caches(memoize.SQLiteStore(path))
+                clock.clear_caches()
+                plan = self.C.plan(targets)
+
+                # Restart: empty in-memory caches, new connection
+                clock.persist_caches(None)
+                clock.clear_caches()
+                clock.persist_caches(memoize.SQLiteStore(path))
+
+                restored = self.C.plan(targets)
+                self.assertTrue(planner.plan_outputs.store_hits == 1)
+                self.assertTrue(restored is not plan)
+                self.assertTrue(restored.parameters() == plan.parameters())
+            finally:
+                clock.persist_caches(None)
+
+    def test_apply(self):
+        targets = {0: 10e6, 1: 14.07e6, 7: 5e6}
+        plan = self.C.plan(targets)
+        self.C.apply(plan)
+
+        for name, value in plan.parameters().items():
+            self.assertTrue(self.C[name] == value, name)
+
+        for MS, out in plan.outputs.items():
+            self.assertAlmostEqual(self.C.f_MS[MS], out['f']*out['R'])
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import time
+import random
+import pathlib
+from fractions import Fraction
+
+import context
+
+from snail.Si5351_Clock import rational
+from snail.Si5351_Clock import constants
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestRationalApproximation(unittest.TestCase):
+    def setUp(self):
+        random.seed(1234)
+
+    def tearDown(self):
+        pass
+
+    def test_exact(self):
+        self.assertTrue(rational.rational_approximation(3.0) == (3, 1))
+        self.assertTrue(rational.rational_approximation(0.75) == (3, 4))
+        self.assertTrue(rational.rational_approximation(3.14159, max_den=100) == (311, 99))
+
+        # Last partial quotient of exact fractions
+        self.assertTrue(rational.rational_approximation(0.5, max_den=constants.C_MAX) == (1, 2))
+        self.assertTrue(rational.rational_approximation(0.25, max_den=constants.C_MAX) == (1, 4))
+        self.assertTrue(rational.rational_approximation(3/80, max_den=constants.C_MAX) == (3, 80))
+        self.assertTrue(rational.rational_approximation(30.5, max_den=constants.C_MAX) == (61, 2))
+
+    def test_degenerate_bounds(self):
+        self.assertTrue(rational.rational_approximation(0.3, lohi_num=(0, 0)) == (0, 1))
+        self.assertTrue(list(rational.eval_chain([0, 3], max_num=0)) == [(0, 1)])
+        self.assertTrue(list(rational.eval_chain([2, 3], max_den=0)) == [])
+
+    def test_best(self):
+        for k in range(2000):
+            value = random.uniform(0, 3000)
+            max_den = random.choice([7, 1000, constants.C_MAX])
+
+            n, d = rational.rational_approximation(value, max_den=max_den)
+            best = Fraction(value).limit_denominator(max_den)
+
+            self.assertTrue(d <= max_den)
+            self.assertTrue(abs(value - n/d) <= abs(value - float(best))*(1 + 1e-9) + 1e-15, value)
+
+    def test_max_num(self):
+        n, d = rational.rational_approximation(0.123456789, max_num=50)
+        self.assertTrue((n, d) == (10, 81))
+
+    def test_semiconvergent(self):
+        # Partial quotient near 2**20, a linear scan of semiconvergents is slow here
+        value = 1/(2**20 - 0.5)
+
+        t0 = time.perf_counter()
+        for k in range(100):
+            n, d = rational.rational_approximation(value, max_den=constants.C_MAX)
+        dt = time.perf_counter() - t0
+
+        self.assertTrue((n, d) == (1, constants.C_MAX))
+        self.assertTrue(dt < 0.1, dt)
+
+    def test_eval_chain(self):
+        # 415/93 = [4; 2, 6, 7]
+        approximations = list(rational.eval_chain([4, 2, 6, 7]))
+        self.assertTrue(approximations == [(4, 1), (9, 2), (58, 13), (415, 93)])
+
+        approximations = list(rational.eval_chain([4, 2, 6, 7], max_den=80))
+        self.assertTrue(approximations == [(4, 1), (9, 2), (58, 13), (357, 80)])
+
+        # Semiconvergents below half the partial quotient are not best approximations
+        approximations = list(rational.eval_chain([4, 2, 6, 7], max_den=50))
+        self.assertTrue(approximations == [(4, 1), (9, 2), (58, 13)])
+
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,78 @@
+
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+import os
+import pathlib
+
+import context
+
+from snail.Si5351_Clock import clock
+from snail.Si5351_Clock import sweep
+
+_path_module = pathlib.Path(__file__).parent.absolute()
+
+
+#------------------------------------------------
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.C = clock.Clock(debug=True, shadow=True)
+        self.C.config_PLL(800e6)
+        self.C.config_MS(10e6, 1)
+        self.C['R1_DIV'] = 0b011
+
+        self.freqs = [10e6 + 1e3*k for k in range(50)]
+        self.table = sweep.compile_sweep(self.C, 1, self.freqs)
+
+    def tearDown(self):
+        pass
+
+    def test_table(self):
+        self.assertTrue(len(self.table) == len(self.freqs))
+        self.assertTrue(self.table.register == 50 and self.table.width == 8)
+        self.assertTrue(len(self.table.payload) == 8*len(self.freqs))
+        for f, f_set in zip(self.freqs, self.table.frequencies):
+            self.assertAlmostEqual(f, f_set, delta=1e-3)
+
+    def test_play(self):
+        for k in sweep.play(self.C, self.table):
+            f = self.freqs[k]
+            a, b, c = clock.compute_abc(self.C.f_PLL['A']/f)
+            P = clock.encode_abc(a, b, c)
+            for j in range(3):
+                self.assertTrue(self.C['MS1_P{}'.format(j+1)] == P[j], (k, j))
+            self.assertTrue(self.C['R1_DIV'] == 0b011)
+
+        self.assertTrue(k == len(self.freqs) - 1)
+        self.assertAlmostEqual(self.C.f_MS[1], self.freqs[-1], delta=1e-3)
+
+        # Shadow no longer trusted for the sweep registers
+        self.C['R1_DIV'] = 0b001
+        self.assertTrue(self.C['MS1_P1'] == clock.encode_abc(*clock.compute_abc(self.C.f_PLL['A']/self.freqs[-1]))[0])
+
+    def test_repeat(self):
+        steps = []
+        for k in sweep.play(self.C, self.table, repeat=True):
+            steps.append(k)
+            if len(steps) == 2*len(self.table):
+                break
+
+        self.assertTrue(steps == list(range(len(self.table)))*2)
+
+    def test_uncached(self):
+        clock.clear_caches()
+        sweep.compile_sweep(self.C, 1, [11e6 + 1e3*k for k in range(100)])
+
+        info = clock.cache_info()
+        self.assertTrue(info['compute_abc'].currsize == 0)
+        self.assertTrue(info['encode_abc'].currsize == 0)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, sweep.compile_sweep, self.C, 6, self.freqs)
+        self.assertRaises(ValueError, sweep.compile_sweep, self.C, 1, [0])
+
+
+#------------------------------------------------
+if __name__ == '__main__':
+    unittest.main(verbosity=2)